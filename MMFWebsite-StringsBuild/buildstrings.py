@@ -9,7 +9,8 @@ It compiles .xcstrings files, which hold the localizable strings for the website
 
 import argparse
 import os
-import glob
+import hashlib
+import concurrent.futures
 from collections import defaultdict
 import json
 
@@ -27,6 +28,73 @@ xcstrings_root          = "./locales/strings/repo-root/"
 
 output_path             = "./locales/Localizable.js"
 
+cache_dir               = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')   # Holds the caches of this script. It's inside the scripts repo (not the website repo) and it's covered by the scripts repo's .gitignore.
+build_cache_path        = os.path.join(cache_dir, 'inputs_fingerprint.txt')                   # Stores a fingerprint of the inputs of the last build. If the inputs haven't changed since, we skip the build. (Delete this file to force a rebuild.)
+
+# Fragments of the output .js file
+#   The parts that don't depend on the input data. We write the data in between these fragments. See the rendering code in main().
+js_fragment_header = b"""\
+//
+// AUTOGENERATED - DO NOT EDIT
+// This file is automatically generated and should not be edited manually. 
+// It was converted from an .xcstrings file, by the StringsBuild script (which is from the mac-mouse-fix-scripts repo).
+//
+export default {
+    "sourceLocale": \""""
+js_fragment_after_source_locale = b"""",
+    "locales": """
+js_fragment_after_locales = b""",
+    "strings":
+    {
+"""
+js_fragment_footer = b"""\
+    }
+    
+};
+"""
+
+#
+# Helper
+#
+
+def find_xcstrings(root):
+    
+    # Recursively yields the paths of all .xcstrings files inside `root`
+    #   Notes: 
+    #   - We use os.scandir() instead of glob, since scandir's DirEntry objects already know whether they're a directory, so we don't need an extra stat() call per entry. 
+    #   - We also don't need glob's pattern matching here. Checking the file extension is enough.
+    
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from find_xcstrings(entry.path)
+            elif entry.name.endswith('.xcstrings'):
+                yield entry.path
+
+def get_inputs_fingerprint(input_paths):
+    
+    # Returns a hash over the path, modification time, and size of all the `input_paths`.
+    #   If the hash is the same as for the last build, the output would be the same, too, so we can skip the build.
+    #   Notes:
+    #   - We only stat() the files instead of hashing their content. That makes the check almost free.
+    #   - We also hash the absolute path of the output file. The cache_dir lives outside the website repo, so this makes sure a fingerprint from another checkout of the website repo doesn't match.
+    
+    hasher = hashlib.blake2b(usedforsecurity=False)
+    hasher.update(f'{os.path.abspath(output_path)}\n'.encode('utf-8'))
+    for path in sorted(input_paths):
+        stat = os.stat(path)
+        hasher.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode('utf-8'))
+    
+    return hasher.hexdigest()
+
+def load_xcstrings(xcstrings_path):
+    
+    # Notes:
+    # - mfutils.read_xcstrings_file() reads the file as bytes and parses it with orjson if it's installed. (Both orjson and stdlib json accept bytes, so we skip the utf-8 decoding step.)
+    # - We only use orjson for parsing. For rendering the output we keep using stdlib json, since orjson doesn't support 4-space indents, and we want the output to stay diff-stable.
+    
+    return mfutils.read_xcstrings_file(xcstrings_path)
+
 #
 # Main
 #
@@ -42,8 +110,22 @@ def main():
     # Log
     print(f'compile_website_strings: Begin')
     
-    # Find mmf-project locales
+    # Find xcstrings files
+    vue_xcstrings_paths = sorted(find_xcstrings(xcstrings_root))
+    
+    # Get xcodeproj path
     xcodeproj_path = mflocales.path_to_xcodeproj[repo_name]
+    
+    # Check if the inputs changed since the last build
+    #   Notes: 
+    #   - The inputs are the .xcstrings files, the xcode project (which determines the locales), and the scripts themselves.
+    input_paths = vue_xcstrings_paths + [quotes_xcstrings_path, f'{xcodeproj_path}/project.pbxproj', __file__, mflocales.__file__, mfutils.__file__]
+    inputs_fingerprint = get_inputs_fingerprint(input_paths)
+    if os.path.exists(output_path) and os.path.exists(build_cache_path) and mfutils.read_file(build_cache_path) == inputs_fingerprint:
+        print(f'compile_website_strings: Inputs have not changed since the last build. {output_path} is up to date.')
+        return
+    
+    # Find mmf-project locales
     source_locale, translation_locales = mflocales.find_xcode_project_locales(xcodeproj_path)
     locales = [source_locale] + translation_locales
     
@@ -55,24 +137,40 @@ def main():
     locales = mflocales.sorted_locales(locales, source_locale)
     
     # Load xcstrings files
-    vue_xcstrings_list = []
-    for xcstrings_path in glob.glob(xcstrings_root + '**/*.xcstrings'):
-        vue_xcstrings_list.append(json.loads(mfutils.read_file(xcstrings_path)))
-    quotes_xcstrings = json.loads(mfutils.read_file(quotes_xcstrings_path))
-    all_xcstrings_list = vue_xcstrings_list + [quotes_xcstrings]
-    
-    # Get progress
-    progress = mflocales.get_localization_progress(all_xcstrings_list, translation_locales)
+    #   We load them on a thread pool so the file reads and parsing overlap. (executor.map() returns the results in the same order as the paths.)
+    all_xcstrings_paths = vue_xcstrings_paths + [quotes_xcstrings_path]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(all_xcstrings_paths))) as executor:
+        all_xcstrings_list = list(executor.map(load_xcstrings, all_xcstrings_paths))
     
     # Log
-    print(f'compile_website_strings: Loaded vue .xcstrings files at {vue_xcstrings_list}, loaded Quotes.xcstrings from: {quotes_xcstrings_path}')
+    print(f'compile_website_strings: Loaded vue .xcstrings files at {vue_xcstrings_paths}, loaded Quotes.xcstrings from: {quotes_xcstrings_path}')
+    
+    # Compile translations and progress
+    #   Notes:
+    #       - Note that we enabled fallbacks. This means the resulting Localizable.js file will aleady contain best-effort fallbacks for each string for each language. 
+    #           So we don't need extra fallback logic inside the mmf-website code.
+    #       - We walk each xcstrings file only once and look up the values for all locales at the same time. (Instead of walking all the files again for every locale.)
+    #           In the same pass, we count the translation states, which we need to get the localization progress. (Instead of walking all the files again in mflocales.get_localization_progress().)
+    #       - We don't need to validate that there's a value for every string here, since get_translations() raises a LookupError if it can't find a value when fallbacks are enabled.
+    fallback_chains = mflocales.build_fallback_chains(locales, source_locale)
+    all_translations_by_key = []
+    localization_state_counts = {locale: defaultdict(lambda: 0) for locale in translation_locales}
+    missing_keys = {locale: [] for locale in translation_locales}
+    for xcstrings in all_xcstrings_list:
+        translations_by_key = {}
+        for key, string_dict in xcstrings['strings'].items():
+            translations_by_key[mflocales.remove_index_prefix_from_key(key)] = mflocales.get_translations(xcstrings, key, locales, fall_back_to_next_best_language=True, fallback_chains=fallback_chains)
+            for locale, s in zip(translation_locales, mflocales.get_localization_states(string_dict, translation_locales)):
+                localization_state_counts[locale][s] += 1
+                if s in mflocales.should_translate_states_set:
+                    missing_keys[locale].append(key)
+        all_translations_by_key.append(translations_by_key)
     
-    # Compile
+    # Get progress
+    progress = mflocales.get_localization_progress_from_state_counts(localization_state_counts, missing_keys)
     
-    # Compile xcstrings 
-    vuestrings = {}
+    # Compile list-of-languages dict
     vuelangs = []
-    
     for locale in locales:
 
         # Get progress string 
@@ -86,49 +184,56 @@ def main():
             'name': mflocales.locale_to_language_name(locale, locale, include_flag=True),
             'progressDisplay': progress_display,
         })
-        
-        # Compile new vuestrings dict
-        #   that @nuxtjs/i18n can understand
-        #   Notes:
-        #       - Note that we enabled fallbacks. This means the resulting Localizable.js file will aleady contain best-effort fallbacks for each string for each language. 
-        #           So we don't need extra fallback logic inside the mmf-website code.
-        vuestrings[locale] = {}
-        for xcstrings in all_xcstrings_list:
-            for key in xcstrings['strings']:
-                value, locale_of_value = mflocales.get_translation(xcstrings, key, locale, fall_back_to_next_best_language=True)
-                assert value != None # Since we enabled fallbacks, there should be a value for every string
-                key = mflocales.remove_index_prefix_from_key(key)
-                vuestrings[locale][key] = value
-            
-    # Render the compiled data to a .js file
-    #   We could also render it to json, but json doesn't allow comments, which we want to add.
-    vuestrings_json = json.dumps(vuestrings, ensure_ascii=False, indent=4)
-    vuelangs_json = json.dumps(vuelangs, ensure_ascii=False, indent=4)
-    js_string = f"""\
-//
-// AUTOGENERATED - DO NOT EDIT
-// This file is automatically generated and should not be edited manually. 
-// It was converted from an .xcstrings file, by the StringsBuild script (which is from the mac-mouse-fix-scripts repo).
-//
-export default {{
-    "sourceLocale": "{source_locale}",
-    "locales": {vuelangs_json},
-    "strings":
-{mfutils.add_indent(vuestrings_json, 4)}
     
-}};
-"""
+    # Define helper
+    def compile_vuestrings(locale):
+        
+        # Compile the vuestrings dict for `locale` that @nuxtjs/i18n can understand.
+        #   We copy the values using dict comprehensions, which are a lot faster than assigning the values one-by-one in a python loop.
+        
+        result = {}
+        for translations_by_key in all_translations_by_key:
+            result.update({key: translations[locale][0] for key, translations in translations_by_key.items()})
+        return result
     
     # Log
-    print(f'compile_website_strings: Compiled strings dict for nuxtjs i18n')
-
-    # Write to output_path
-    with open(output_path, 'w') as file:
-        file.write(js_string)
+    print(f'compile_website_strings: Compiled strings for nuxtjs i18n')
+    
+    # Render the compiled data to a .js file
+    #   Notes:
+    #   - We could also render it to json, but json doesn't allow comments, which we want to add.
+    #   - We render and write the vuestrings one locale at a time, so we never build the nested `{ locale: vuestrings }` dict, or one json string for all locales. 
+    #       (The output is the same as rendering the whole `{ locale: vuestrings }` dict with json.dumps(indent=4) and then indenting it by 4.)
+    #       This doesn't reduce peak memory much though: all_translations_by_key already holds the resolved translations for all locales, and we keep it around until all locales are written. 
+    #       (To hold only one locale at a time, we'd have to resolve the translations through the fallback chains inside compile_vuestrings(), which means walking all the strings again for every locale.)
+    #   - We encode to utf-8 ourselves and write bytes. (Text mode would use the platform's default encoding, and would translate newlines.)
+    #   - We write to a temp file and then move it into place. That way, a crash can never leave a half-written Localizable.js behind, which nuxt would then try to use. 
+    #       (And the inputs fingerprint, which we store after this, always matches the output.)
+    #   - We use a large write buffer, since we write the file in many small pieces.
+    vuelangs_json = json.dumps(vuelangs, ensure_ascii=False, indent=4)
+    output_temp_path = output_path + '.tmp'
+    with open(output_temp_path, 'wb', buffering=1<<20) as file:
+        file.write(js_fragment_header)
+        file.write(source_locale.encode('utf-8'))
+        file.write(js_fragment_after_source_locale)
+        file.write(vuelangs_json.encode('utf-8'))
+        file.write(js_fragment_after_locales)
+        for i, locale in enumerate(locales):
+            vuestrings_json = json.dumps(compile_vuestrings(locale), ensure_ascii=False, indent=4).replace('\n', '\n        ') # Indent by 8. (Like mfutils.add_indent(), but without indenting the first line.)
+            separator = ',' if i < len(locales) - 1 else ''
+            file.write(f'        {json.dumps(locale, ensure_ascii=False)}: {vuestrings_json}{separator}\n'.encode('utf-8'))
+        file.write(js_fragment_footer)
+    os.replace(output_temp_path, output_path)
     
     # Log
     print(f'compile_website_strings: Wrote strings dict to {output_path}')
     
+    # Store the inputs fingerprint
+    #   Note: We write to a temp file and then move it into place, so a crash can never leave a half-written fingerprint behind.
+    os.makedirs(cache_dir, exist_ok=True)
+    mfutils.write_file(build_cache_path + '.tmp', inputs_fingerprint)
+    os.replace(build_cache_path + '.tmp', build_cache_path)
+    
 #
 # Call main
 #
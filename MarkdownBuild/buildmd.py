@@ -14,13 +14,14 @@ import requests
 # import json
 import pycountry
 import datetime
+import time
 import babel.dates
 import re
-import pathlib
 import urllib.parse
-import string
 import os
 import math
+import functools
+import concurrent.futures
 from pprint import pprint # For debugging
 import json
 
@@ -71,27 +72,34 @@ def get_document_keys():
     result_lowercase = []
     result = []
 
-    for item in os.listdir(template_root):
+    with os.scandir(template_root) as entries:
+        for entry in entries:
 
-        # Get stem
-        filename_stem, ext = os.path.splitext(item)
+            # Get stem
+            filename_stem, ext = os.path.splitext(entry.name)
 
-        # Guard
-        if not os.path.isfile(item): continue
-        if not ext == '.md': continue
+            # Guard
+            #   Note: We used to check `os.path.isfile(item)` here, but that resolved the filename relative to the cwd instead of the template_root. (It only worked because the compiled English documents happen to have the same names and live in the repo root.)
+            #       DirEntry.is_file() checks the right file and doesn't need an extra stat() call.
+            if not entry.is_file(): continue
+            if not ext == '.md': continue
 
-        # Store result
-        result.append(filename_stem)
+            # Store result
+            result.append(filename_stem)
 
-        # Validate
-        assert filename_stem.lower() not in result_lowercase, f"Found duplicate template name: {item}. (Checked case-insensitively.) (This is a problem because the template names determine the document keys, which we might want to use case-insensitively. So the template names need to be case-insensitively unique.)"
-        result_lowercase.append(filename_stem.lower())
+            # Validate
+            assert filename_stem.lower() not in result_lowercase, f"Found duplicate template name: {entry.name}. (Checked case-insensitively.) (This is a problem because the template names determine the document keys, which we might want to use case-insensitively. So the template names need to be case-insensitively unique.)"
+            result_lowercase.append(filename_stem.lower())
     
     return result
 
 def path_to_repo_root(path):
-    parent_count = len(pathlib.Path(path).parents)
-    root_path = '../' * (parent_count-1)
+    
+    # Notes:
+    # - We count the separators in the (relative, normalized) path instead of building a pathlib.Path and counting its `.parents`. That's equivalent but much cheaper, and we call this for every locale.
+    
+    parent_count = path.strip('/').count('/')
+    root_path = '../' * parent_count
     return root_path
 
 def path_to_compiled_doc_root(thisdoc_path: str, locale: str, development_locale: str):
@@ -110,8 +118,9 @@ def path_to_compiled_doc_root(thisdoc_path: str, locale: str, development_locale
     thisdoc_path_relative = thisdoc_path.removeprefix(docroot)
 
     # Construct path from thisdoc to docroot
-    parent_count = len(pathlib.Path(thisdoc_path_relative).parents)
-    root_path = '../' * (parent_count-1)
+    #   Note: Counting separators like in path_to_repo_root(). The relative path starts with a '/' after removing the docroot prefix, which is why we strip.
+    parent_count = thisdoc_path_relative.strip('/').count('/')
+    root_path = '../' * parent_count
 
     # Return
     return root_path
@@ -151,9 +160,9 @@ sales_count_rounder = 100 # Round sales counts to multiple of this number. This
 gumroad_sales_cache_file = "Markdown/gumroad_sales_cache.json"  # DONT leak this. If you move/rename this, make sure it's covered by .gitignore. It's inside the Markdown folder to be a bit more hidden.
 gumroad_sales_cache_shelf_life = 24                             # In hours
 
-gumroad_custom_field_labels_name = ["Your Name – Will be displayed in the Acknowledgements if you purchase the 2. or 3. Option"]
-gumroad_custom_field_labels_message = ["Your message (Will be displayed next to your name in the Acknowledgements if you purchase the 3. Option)", "Your message – Will be displayed next to your name in the Acknowledgements if you purchase the 3. Option"]
-gumroad_custom_field_labels_dont_display = ["Don't publicly display me as a 'Generous Contributor' under 'Acknowledgements'"]
+gumroad_custom_field_labels_name = ("Your Name – Will be displayed in the Acknowledgements if you purchase the 2. or 3. Option",)
+gumroad_custom_field_labels_message = ("Your message (Will be displayed next to your name in the Acknowledgements if you purchase the 3. Option)", "Your message – Will be displayed next to your name in the Acknowledgements if you purchase the 3. Option")
+gumroad_custom_field_labels_dont_display = ("Don't publicly display me as a 'Generous Contributor' under 'Acknowledgements'",)
 
 gumroad_product_id_euro = "FP8NisFw09uY8HWTvVMzvg=="
 gumroad_product_id_dollar = "OBIdo8o1YTJm3lNvgpQJMQ=="
@@ -164,6 +173,8 @@ gumroad_sales_api = "/v2/sales"
 gumroad_date_format = '%Y-%m-%dT%H:%M:%SZ' # T means nothing, Z means UTC+0 | The date strings that the gumroad sales api returns have this format
 
 name_blacklist = ['mail', 'paypal', 'banking', 'beratung', 'macmousefix'] # TODO: Add Iam | When gumroad doesn't provide a name we use part of the email as the display name. We use the part of the email before @, unless it contains one of these substrings, in which case we use the part of the email after @ but with the `.com`, `.de` etc. removed
+name_blacklist_regex = re.compile('|'.join(map(re.escape, name_blacklist))) # Matches if any of the name_blacklist substrings is contained in a string. Lets us check the whole blacklist in a single scan.
+name_separator_translation_table = str.maketrans('._-–—+', '      ') # Maps separator chars that appear in names (especially email-derived ones) to spaces. Lets display_name() replace all of them in a single pass.
 nbsp = '&nbsp;'  # Non-breaking space. &nbsp; doesn't seem to work on GitHub. (Edit: &nbsp; seems to work on GH now.) Tried '\xa0', too. See https://github.com/github/cmark-gfm/issues/346
 
 #
@@ -177,11 +188,11 @@ def main():
     # Parse args
     parser = argparse.ArgumentParser()
     parser.add_argument("--api_key", default=os.getenv("GUMROAD_API_KEY"), help="Provide a Gumroad API key using the `--api_key` command line argument or by setting the GUMROAD_API_KEY environment variable. You can retrieve your Access Token in the GitHub Secrets or in the Gumroad Settings under Advanced.")
-    parser.add_argument("--document"), # We used to get the document through .getenv, too but that can be confusing I think
+    parser.add_argument("--document", nargs='+'), # We used to get the document through .getenv, too but that can be confusing I think || You can pass several documents to build them in one go. That way, we only find the locales etc. once.
     parser.add_argument("--no_api", action='store_true') # no_api option is not necessary anymore now since we have caching to make things fast when testing.
     args = parser.parse_args()
 
-    document_key = args.document
+    requested_document_keys = args.document
     gumroad_api_key = args.api_key
     no_api = args.no_api
     
@@ -192,7 +203,7 @@ def main():
         print(f"Working with gumroad api key: {gumroad_api_key}")
     
     # Guard --document exists
-    document_key_was_provided = isinstance(document_key, str) and document_key != ''
+    document_key_was_provided = requested_document_keys != None and all(isinstance(document_key, str) and document_key != '' for document_key in requested_document_keys)
     if not document_key_was_provided:
         print("No document key provided. Provide one using the '--document' command line argument")
         sys.exit(1)
@@ -200,16 +211,28 @@ def main():
     # Adjust capitalization of --document
     #   So that the clt arg becomes effectively case-insensitive
     if False:
-        for k in document_keys:
-            if k.lower() == document_key.lower():
-                document_key = k
-                break
+        for i, document_key in enumerate(requested_document_keys):
+            for k in document_keys:
+                if k.lower() == document_key.lower():
+                    requested_document_keys[i] = k
+                    break
     
     # Validate --document
-    document_key_is_valid = document_key in document_keys
-    if not document_key_is_valid:
-        print(f"Unknown document key '{document_key}'. Valid document keys: {list(document_keys)}")
-        sys.exit(1)
+    for document_key in requested_document_keys:
+        document_key_is_valid = document_key in document_keys
+        if not document_key_is_valid:
+            print(f"Unknown document key '{document_key}'. Valid document keys: {list(document_keys)}")
+            sys.exit(1)
+    
+    # Find locales
+    #   Note: This is the same for all documents, so we only do it once.
+    development_locale, translation_locales = mflocales.find_xcode_project_locales(mflocales.path_to_xcodeproj['mac-mouse-fix'])
+    
+    # Build documents
+    for document_key in requested_document_keys:
+        build_document(document_key, development_locale, translation_locales, gumroad_api_key, no_api)
+
+def build_document(document_key: str, development_locale: str, translation_locales: list[str], gumroad_api_key: str|None, no_api: bool):
     
     # Log
     print(f"Generating document: {document_key}")
@@ -218,20 +241,7 @@ def main():
     xcstrings_path = construct_path(document_key, DocType.XCSTRINGS)
 
     # Load xcstrings file as python object
-    xcstrings = []
-    with open(xcstrings_path, 'r') as file:
-        xcstrings = json.load(file)
-    
-    # Remove index-prefixes from keys inside xcstrings obj (e.g. 003:some.key -> some.key)
-    for key in list(xcstrings['strings'].keys()):
-
-        key_without_index = mflocales.remove_index_prefix_from_key(key)
-
-        xcstrings['strings'][key_without_index] = xcstrings['strings'][key]
-        del xcstrings['strings'][key]
-
-    # Find locales
-    development_locale, translation_locales = mflocales.find_xcode_project_locales(mflocales.path_to_xcodeproj['mac-mouse-fix'])
+    xcstrings = load_xcstrings(xcstrings_path, os.stat(xcstrings_path).st_mtime_ns)
     
     # Get translation progress
     translation_progress = mflocales.get_localization_progress([xcstrings], translation_locales)
@@ -244,6 +254,50 @@ def main():
     #   Don't sort these while iterating - will lead to bugs
     iterated_locales = mflocales.sorted_locales(iterated_locales, development_locale)
     
+    # Get template path
+    template_path = construct_path(document_key, DocType.TEMPLATE)
+    
+    # Load template
+    #   Note: We read bytes and decode once, explicitly as utf-8, instead of going through text mode.
+    template_source = mfutils.read_file_bytes(template_path).decode('utf-8')
+    
+    # Extract localizable strings from the template
+    #   Notes:
+    #   - The template and its localizable strings are the same for every locale, so we only do this once, instead of inside the locale loop.
+    #   - We extract from the template before the conditional rendering. Strings inside if-blocks that aren't rendered for a locale are skipped inside the locale loop.
+    localizable_strings = {} # Maps the full match of each localizable string in the template to (localizable string, urls from the template, indent level)
+    for st in mflocales.get_localizable_strings_from_markdown(template_source):
+        
+        # Get urls from the template
+        urls_from_template = mfutils.replace_markdown_urls_with_format_specifiers(st.value).removed_urls
+        
+        # Get the original indentation
+        indent_level, indent_char = mfutils.get_indent(st.value)
+        assert indent_char == ' ' or indent_char == None
+        
+        # Store
+        localizable_strings[st.full_match] = (st, urls_from_template, indent_level)
+    
+    # Compile regex that matches all localizable strings in the template
+    #   Notes:
+    #   - This lets us insert all translations in a single pass over the template, instead of copying the whole template once per localizable string with `template.replace()`.
+    #   - We try longer matches first, so that a localizable string that happens to be a prefix of another one can't shadow it.
+    localizable_strings_regex = None
+    if len(localizable_strings) > 0:
+        localizable_strings_regex = re.compile('|'.join(re.escape(full_match) for full_match in sorted(localizable_strings.keys(), key=len, reverse=True)))
+    
+    # Get destination paths
+    #   Note: We also precompute the percent-encoded paths here, so the language picker of each locale doesn't have to encode the paths of all other locales again.
+    compiled_doc_paths = { locale: construct_path(document_key, DocType.COMPILED_DOC, locale, development_locale) for locale in iterated_locales }
+    quoted_compiled_doc_paths = { locale: urllib.parse.quote(path) for locale, path in compiled_doc_paths.items() } # This percent encodes spaces and others chars which is necessary
+    
+    # Create destination dirs
+    #   Note: We do this once for all locales upfront, instead of inside the locale loop, so we don't hit the filesystem for every locale.
+    destination_dirs = set(os.path.dirname(path) for path in compiled_doc_paths.values())
+    for destination_dir in destination_dirs:
+        if len(destination_dir) > 0:
+            os.makedirs(destination_dir, exist_ok=True)
+    
     # Iterate locales
     for locale in iterated_locales:
         
@@ -254,16 +308,9 @@ def main():
         # Get document subpath
         # document_subpath = document_key_to_filename_map[document_key]
         
-        # Get src and dst paths
-
-        template_path = construct_path(document_key, DocType.TEMPLATE)
-        destination_path = construct_path(document_key, DocType.COMPILED_DOC, locale, development_locale)
+        # Get dst path
+        destination_path = compiled_doc_paths[locale]
         
-        # Load template
-        template = ""
-        with open(template_path, ) as f:
-            template = f.read()
-
         # Do conditional rendering
         #   Explanation: 
         #   - In the template md files we can wrap sections in `{% if <some condition> %}` and `{% endif %}` (we also call these 'jinja-style if-blocks') to render the section only in case <some condition> is set to `True` in the render_condition_dict.
@@ -271,7 +318,7 @@ def main():
         render_condition_dict = {
             'show_localization_progress': (locale != development_locale) and (translation_progress[locale]['percentage'] < 1.0),
         }
-        template = mfutils.conditional_render_with_jinja_if_blocks(template, render_condition_dict)
+        template = mfutils.conditional_render_with_jinja_if_blocks(template_source, render_condition_dict)
 
         # Log
         print('buildmd.py: Inserting translations into template at path {}...'.format(template_path))
@@ -279,8 +326,13 @@ def main():
         # Decare loop state
         missing_translations = []
 
-        # Translate the template
-        for st in mflocales.get_localizable_strings_from_markdown(template):
+        # Define translator
+        #   Notes:
+        #   - This is called once for each occurrence of a localizable string in the (conditionally rendered) template. Strings that were removed by the conditional rendering are never looked up.
+        def translate_match(match):
+            
+            # Unpack
+            st, urls_from_template, indent_level = localizable_strings[match.group(0)]
             
             # Get the translated value
             translation, best_locale = mflocales.get_translation(xcstrings, st.key, locale)
@@ -290,16 +342,17 @@ def main():
                 missing_translations.append({ "key": st.key, "best_locale": best_locale })
             
             # Insert urls from the template into the translation
-            urls_from_template = mfutils.replace_markdown_urls_with_format_specifiers(st.value).removed_urls # We could cache the urls between languages but it doesn't seem to produce noticable slowdown
             translation = mfutils.replace_format_specifiers_with_markdown_urls(translation, urls_from_template)
 
             # Apply the original indentation to the translation
-            indent_level, indent_char = mfutils.get_indent(st.value)
-            assert indent_char == ' ' or indent_char == None
             translation = mfutils.set_indent(translation, indent_level, ' ')
             
-            # Insert translation into template
-            template = template.replace(st.full_match, translation)
+            # Return
+            return translation
+        
+        # Insert translations into template
+        if localizable_strings_regex != None:
+            template = localizable_strings_regex.sub(translate_match, template)
         
         # Log missing translations
         if len(missing_translations) > 0:
@@ -312,18 +365,18 @@ def main():
         # Insert into template
         if document_key == "Readme":
             template = insert_root_paths(template, destination_path, locale, development_locale)
-            template = insert_locale_stuff(template, document_key, locale, development_locale, iterated_locales, translation_progress)
+            template = insert_locale_stuff(template, locale, development_locale, iterated_locales, translation_progress, compiled_doc_paths, quoted_compiled_doc_paths)
         elif document_key == "Acknowledgements":
             template = insert_root_paths(template, destination_path, locale, development_locale) # This is not currently necessary here since we don't use the {root_path} placeholder in the acknowledgements templates
-            template = insert_locale_stuff(template, document_key, locale, development_locale, iterated_locales, translation_progress)
+            template = insert_locale_stuff(template, locale, development_locale, iterated_locales, translation_progress, compiled_doc_paths, quoted_compiled_doc_paths)
             template = insert_acknowledgements(template, locale, gumroad_api_key, gumroad_sales_cache_file, gumroad_sales_cache_shelf_life, no_api)
         else:
             assert False # Should never happen because we check document_key for validity above.
         
         # Validate that template is completely filled out
         #   Note: Having this crash might be annoying for writing documents. If there's an issue we have to understand these weird errors instead of just seeing the problems in the resulting document.
-        template_parse_result = list(string.Formatter().parse(template))
-        template_fields = [tup[1] for tup in template_parse_result if tup[1] is not None]
+        #   Note: We use the same regex as `fill_placeholders()` here, instead of walking the whole template with `string.Formatter().parse()`.
+        template_fields = placeholder_regex.findall(template)
         is_fully_formatted = len(template_fields) == 0
         if not is_fully_formatted:
             print(f"Something went wrong. Template at '{template_path}' still has format field(s) after inserting: {template_fields}")
@@ -332,31 +385,67 @@ def main():
         # Add comment to the top of the document which says that it is autogenerated
         template = "<!-- THIS FILE IS AUTOMATICALLY GENERATED - EDITS WILL BE OVERRIDDEN -->\n" + template
         
-        # Create path
-        destination_dir = os.path.dirname(destination_path)
-        if len(destination_dir) > 0:
-            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-        
         # Write template
-        with open(destination_path, mode="w") as f:
-            f.write(template)
+        with open(destination_path, mode="wb") as f:
+            f.write(template.encode('utf-8'))
         
         # Log
         print('Wrote result to {}'.format(destination_path))
 
+#
+# Load xcstrings
+#
+
+@functools.lru_cache(maxsize=None)
+def load_xcstrings(xcstrings_path: str, mtime_ns: int):
+    
+    # Notes:
+    # - Loads the xcstrings file and removes the index-prefixes from its keys.
+    # - Pass in the modification time of the file, so we reload when the file changes. (The cache only lives as long as the process.)
+    # - Don't mutate the result, since it's shared between callers.
+    
+    # Load xcstrings file as python object
+    xcstrings = mfutils.read_xcstrings_file(xcstrings_path)
+    
+    # Remove index-prefixes from keys inside xcstrings obj (e.g. 003:some.key -> some.key)
+    #   Note: We build a new dict in one pass instead of inserting and deleting keys in-place.
+    xcstrings['strings'] = {mflocales.remove_index_prefix_from_key(key): value for key, value in xcstrings['strings'].items()}
+    
+    # Return
+    return xcstrings
+
 # 
 # Template inserters 
 #
 
+placeholder_regex = re.compile(r'\{([a-zA-Z_][a-zA-Z0-9_]*)\}') # Matches `{some_placeholder}` inside the templates. The placeholder name is captured in the first group.
+
+def fill_placeholders(template: str, values: dict[str, str]) -> str:
+    
+    # Replaces the `{placeholders}` inside `template` with the values for the matching keys in `values`. 
+    #   Notes:
+    #   - This does a single pass over the template, instead of one full pass per placeholder with str.replace().
+    #   - Placeholders that aren't in `values` are left as they are, so that other inserters can fill them in. (If one of them is left over in the end, build_document() will complain.)
+    #   - Since this is a single pass, placeholders inside the inserted values are not filled in.
+    
+    return placeholder_regex.sub(lambda match: values.get(match.group(1), match.group(0)), template)
+
 sales_data_cache = None # This cache is used for different language version of the acknowledgements document. Now that we massively sped up getting all the sales through the gumroad_sales_cache.json file, this isn't really necessary anymore. But it doesn't hurt.
 
 def insert_acknowledgements(template, locale_str, gumroad_api_key, cache_file, cache_shelf_life, no_api):
     
     global sales_data_cache
     
+    # Premature return
+    #   If the template doesn't contain any of our placeholders, there's nothing to insert, so we don't need to load and process the sales at all.
+    if not any(placeholder in template for placeholder in ('{very_generous}', '{generous}', '{sales_count}')):
+        print('Template contains no acknowledgements placeholders. Not loading sales.')
+        return template
+    
     all_sales_count = None
     generous_sales = None
     very_generous_sales = None
+    very_generous_sale_dates = None
     
     if sales_data_cache != None:
         
@@ -367,6 +456,7 @@ def insert_acknowledgements(template, locale_str, gumroad_api_key, cache_file, c
         all_sales_count = sales_data_cache['all_sales_count']
         generous_sales = sales_data_cache['generous_sales']
         very_generous_sales = sales_data_cache['very_generous_sales']
+        very_generous_sale_dates = sales_data_cache['very_generous_sale_dates']
         
     else: 
         
@@ -443,7 +533,7 @@ def insert_acknowledgements(template, locale_str, gumroad_api_key, cache_file, c
         # Premature return
         #   This happens e.g. if the no_api option is set and there is also no cache.
         if len(sales) == 0:
-            template = template.replace('{very_generous}', 'NO_DATA').replace('{generous}', 'NO_DATA').replace('{sales_count}', 'NO_DATA')
+            template = fill_placeholders(template, {'very_generous': 'NO_DATA', 'generous': 'NO_DATA', 'sales_count': 'NO_DATA'})
             return template
         
         # Record all sales count
@@ -454,21 +544,39 @@ def insert_acknowledgements(template, locale_str, gumroad_api_key, cache_file, c
         
         print('Filtering sales...')
         
-        # Filter people who don't want to be displayed
+        # Filter people who don't want to be displayed, and filter generous and very generous
+        #   Note: We do this in a single pass over the sales. The generous and very generous checks are independent, so a sale could be in both lists (though with the current product options it never is).
+        
+        generous_sales = []
+        very_generous_sales = []
         
         print('')
-        sales = list(filter(wants_display, sales))
+        for sale in sales:
+            if not wants_display(sale):
+                continue
+            if is_generous(sale):
+                generous_sales.append(sale)
+            if is_very_generous(sale):
+                very_generous_sales.append(sale)
         print('')
-        
-        # Filter generous and very generous
-        generous_sales = list(filter(is_generous, sales))
-        very_generous_sales = list(filter(is_very_generous, sales))
+    
+        # Parse the dates of the very generous sales
+        #   Note: We do this once here, instead of in the loop that generates the very generous markdown, since that loop runs again for every locale.
+        very_generous_sale_dates = []
+        for sale in very_generous_sales:
+            date_string = sale['created_at']
+            date = datetime.datetime.strptime(date_string, gumroad_date_format)
+            if date == None:
+                print('Couldnt extract date from string {}'.format(date_string))
+                exit(1)
+            very_generous_sale_dates.append(date)
     
         # Create cache and store in cache
         sales_data_cache = dict()
         sales_data_cache['all_sales_count'] = all_sales_count
         sales_data_cache['generous_sales'] = generous_sales
         sales_data_cache['very_generous_sales'] = very_generous_sales
+        sales_data_cache['very_generous_sale_dates'] = very_generous_sale_dates
     
     # Log
     print('Compiling generous contributor strings...')
@@ -480,48 +588,38 @@ def insert_acknowledgements(template, locale_str, gumroad_api_key, cache_file, c
     
     # Generate generous markdown
     
-    generous_string = ''
-    first_iteration = True
-    for sale in generous_sales:
-        
-        if not first_iteration:
-            generous_string += nbsp + ' ' # nbsp + '| '
-        first_iteration = False
-        
-        generous_string += display_name(sale)
+    #   Note: We collect the parts in a list and join them once at the end, instead of growing the string with += for every sale.
+    
+    generous_string = (nbsp + ' ').join(display_name(sale) for sale in generous_sales) # nbsp + '| '
 
     # Generate very generous markdown
         
-    very_generous_string = ''
+    very_generous_parts = []
     
     last_month = None
     first_iteration = True
     
-    for sale in very_generous_sales:
-        date_string = sale['created_at']
-        date = datetime.datetime.strptime(date_string, gumroad_date_format)
-        if date == None:
-            print('Couldnt extract date from string {}'.format(date_string))
-            exit(1)
+    for sale, date in zip(very_generous_sales, very_generous_sale_dates):
         
         if date.month != last_month:
             
             last_month = date.month
             
             if not first_iteration:
-                very_generous_string += '\n\n'
+                very_generous_parts.append('\n\n')
             first_iteration = False
             
-            locale = babel.Locale.parse(locale_str, sep='-')
-            very_generous_string += '**{}**\n'.format(babel.dates.format_datetime(datetime=date, format='LLLL yyyy', locale=locale)) # See https://babel.pocoo.org/en/latest/dates.html and https://babel.pocoo.org/en/latest/api/dates.html#babel.dates.format_datetime.
+            very_generous_parts.append('**{}**\n'.format(month_label(date.year, date.month, locale_str)))
         
         name = display_name(sale)
         message = user_message(sale, name)
         
+        very_generous_parts.append('\n- ')
+        very_generous_parts.append(name)
         if len(message) > 0:
-            very_generous_string += '\n- ' + name + f' - "{message}"'
-        else:
-            very_generous_string += '\n- ' + name
+            very_generous_parts.append(f' - "{message}"')
+    
+    very_generous_string = ''.join(very_generous_parts)
     
     # Log
     print('\nGenerous string:\n\n{}\n'.format(generous_string))
@@ -530,15 +628,15 @@ def insert_acknowledgements(template, locale_str, gumroad_api_key, cache_file, c
     print('Inserting into template:\n\n{}\n'.format(template))
     
     # Insert into template
-    # str.format forces us to replace all the template placeholders at once, which we don't want, so we use str.replace
+    # str.format forces us to replace all the template placeholders at once, which we don't want, so we use fill_placeholders()
     
     # template = template.format(very_generous=very_generous_string, generous=generous_string, sales_count=all_sales_count)
-    template = template.replace('{very_generous}', very_generous_string).replace('{generous}', generous_string).replace('{sales_count}', all_sales_count_rounded)
+    template = fill_placeholders(template, {'very_generous': very_generous_string, 'generous': generous_string, 'sales_count': all_sales_count_rounded})
     
     # Return
     return template
     
-def insert_locale_stuff(template: str, document_key: str, locale: str, development_locale: str, locales: list[str], translation_progress: dict):
+def insert_locale_stuff(template: str, locale: str, development_locale: str, locales: list[str], translation_progress: dict, compiled_doc_paths: dict[str, str], quoted_compiled_doc_paths: dict[str, str]):
     
     # Process `locale`
     language_name = f'{mflocales.locale_to_language_name(locale, locale, True)}'
@@ -546,6 +644,10 @@ def insert_locale_stuff(template: str, document_key: str, locale: str, developme
     # Filter locales
     #   Note: We filter out locales from the locale picker whose progress is under show_locale_threshold. This follows the logic we use for the LocalePicker on the MMF website. See usage of `showLocaleThreshold` in the MMF Website.
     locales = list(filter(lambda l: (l == development_locale) or (l == locale) or (translation_progress[l]['percentage'] > show_locale_threshold), locales))
+    
+    # Get path from the `locale` document to the repo root
+    #   Note: This is the same for every entry in the language list, so we compute it outside the loop.
+    root_path = path_to_repo_root(compiled_doc_paths[locale])
 
     # Generate language list ui string
     ui_language_list = ''
@@ -556,11 +658,8 @@ def insert_locale_stuff(template: str, document_key: str, locale: str, developme
         language_name2 = f'{mflocales.locale_to_language_name(locale2, locale2, True)}'
         
         # Create relative path from the location of the `language_dict` document to the `language_dict2` document. This relative path works as a link. See https://github.blog/2013-01-31-relative-links-in-markup-files/
-        path = construct_path(document_key, DocType.COMPILED_DOC, locale, development_locale)
-        path2 = construct_path(document_key, DocType.COMPILED_DOC, locale2, development_locale)
-        root_path = path_to_repo_root(path)
-        relative_path = root_path + path2
-        link = urllib.parse.quote(relative_path) # This percent encodes spaces and others chars which is necessary
+        #   Note: The root_path only consists of '../', which isn't affected by percent encoding, so we can just prepend it to the precomputed quoted path.
+        link = root_path + quoted_compiled_doc_paths[locale2]
         
         ui_language_list += '  '
         
@@ -576,17 +675,17 @@ def insert_locale_stuff(template: str, document_key: str, locale: str, developme
     # Log    
     print(f'\nLanguage picker language list generated for language "{language_name}":\n{ui_language_list}\n')
     
-    # Insert language list
-    #   template = template.format(current_language=language_name, language_list=ui_language_list)
-    template = template.replace('{language_list}', ui_language_list)
-    
     # Gather info
     localization_progress_str = '100%' if (locale == development_locale) else (str(int(100 * translation_progress[locale]['percentage'])) + '%')
 
-    # Insert other stuff    
-    template = template.replace('{locale_code}', locale)
-    template = template.replace('{localization_progress}', localization_progress_str)
-    template = template.replace('{current_language}', mflocales.locale_to_language_name(locale, destination_locale_str=locale, include_flag=True)) # Note: Maybe rename current_language to locale_name?
+    # Insert language list and other stuff
+    #   template = template.format(current_language=language_name, language_list=ui_language_list)
+    template = fill_placeholders(template, {
+        'language_list': ui_language_list,
+        'locale_code': locale,
+        'localization_progress': localization_progress_str,
+        'current_language': language_name, # Note: Maybe rename current_language to locale_name?
+    })
 
     # Return
     return template
@@ -604,8 +703,10 @@ def insert_root_paths(template, path, locale, development_locale):
     repo_root = path_to_repo_root(path)
     language_root = path_to_compiled_doc_root(path, locale, development_locale)
     
-    template = template.replace('{repo_root}', repo_root)
-    template = template.replace('{language_root}', language_root) # Maybe rename to 'locale_root'? We try to use 'locale' consistently in the python scripts now (as of 07.09.2024, see mflocales.py discussion)
+    template = fill_placeholders(template, {
+        'repo_root': repo_root,
+        'language_root': language_root, # Maybe rename to 'locale_root'? We try to use 'locale' consistently in the python scripts now (as of 07.09.2024, see mflocales.py discussion)
+    })
     
     return template
 
@@ -614,8 +715,32 @@ def insert_root_paths(template, path, locale, development_locale):
 #
 
  
+debug_display_name = False # Set to True to enable debug logging inside compute_display_name()
+display_name_cache = {}  # Maps sale ids to display names. display_name() is called several times for each sale (e.g. in wants_display(), and then again when rendering the acknowledgements for every locale), so we cache it.
+user_message_cache = {}  # Maps (sale id, name) to user messages. Same reason as display_name_cache.
+
 def display_name(sale):
     
+    sale_id = sale['id']
+    result = display_name_cache.get(sale_id, None)
+    if result == None:
+        result = compute_display_name(sale)
+        display_name_cache[sale_id] = result
+    
+    return result
+
+def user_message(sale, name):
+    
+    cache_key = (sale['id'], name)
+    result = user_message_cache.get(cache_key, None)
+    if result == None:
+        result = compute_user_message(sale, name)
+        user_message_cache[cache_key] = result
+    
+    return result
+
+def compute_display_name(sale):
+    
     name = ''
 
     # Special requests & rules
@@ -650,11 +775,7 @@ def display_name(sale):
         n1, _, _ = n1.partition('+')
         
         # Check blacklist
-        use_n1 = True
-        for non_name in name_blacklist:
-            if non_name in n1:
-                use_n1 = False
-                break
+        use_n1 = name_blacklist_regex.search(n1) == None
         
         if use_n1:
             name = n1
@@ -662,8 +783,7 @@ def display_name(sale):
             name = n2.partition('.')[0] # In a case like gm.ail.com, we want gm.ail, but this will just return gm. But should be good enough. Edit: Why would we display the users name as 'gmail'? Why not just 'A friendly user' at that point? I guess because some ppl have me@noah.nuebling.com addresses?
 
     # Replace weird separators with spaces
-    for char in '._-–—+':
-        name = name.replace(char, ' ')
+    name = name.translate(name_separator_translation_table)
 
     # Correct case
     #   The full_name field is sometimes in all caps and the email based heuristic returns all lower-case
@@ -681,7 +801,7 @@ def display_name(sale):
     name = normalize_whitespace_for_user_generated(name)
     
     # Debug
-    if name == "🇩🇪 Gmail":
+    if debug_display_name and name == "🇩🇪 Gmail":
         print("Hughhhh")
     
     # Replace all spaces with non-breaking spaces
@@ -702,9 +822,7 @@ def emoji_flag(sale):
     
         country_name = sale.get('country', '')
                 
-        pycountry_object = pycountry.countries.get(name=country_name)
-        if pycountry_object:
-            country_code = pycountry_object.alpha_2
+        country_code = country_code_from_country_name(country_name)
         
         if country_code == '':
             
@@ -714,13 +832,29 @@ def emoji_flag(sale):
                 country_code = "TW"
             
     
+    return emoji_flag_from_country_code(country_code)
+
+@functools.lru_cache(maxsize=None) # pycountry lookups by name are slow, and the same few country names come up over and over, so we cache them.
+def country_code_from_country_name(country_name: str):
+    
+    # Returns the alpha-2 country code for the country name, or '' if pycountry doesn't know the name.
+    
+    pycountry_object = pycountry.countries.get(name=country_name)
+    if pycountry_object:
+        return pycountry_object.alpha_2
+    
+    return ''
+
+@functools.lru_cache(maxsize=None) # Most sales come from a handful of countries, so we only compute each flag once.
+def emoji_flag_from_country_code(country_code: str):
+    
+    # Notes:
+    # - The emoji flag consists of the 'regional indicator symbols' for the two letters of the country code. Those are offset from the ascii capital letters by 127397.
+    
     if country_code == '':
         return ''
     
-    result = ''
-    for c in country_code.upper():
-        result += chr(ord(c) + 127397)
-    return result
+    return ''.join(chr(ord(c) + 127397) for c in country_code.upper())
  
 def is_generous(sale):
     
@@ -761,35 +895,25 @@ def wants_display(sale):
     # Declare result
     result = True
     
-    while True: # This is a goto statement, not a loop
-        
-        # 
-        # Special requests & rules
-        #
+    # 
+    # Special requests & rules
+    #
 
-        name = display_name(sale).replace(nbsp, ' ') # We should perhaps cache access to the display_name() and user_message(), since we calculcate it several times for each sale. But seems fast enough for now. And makes for easier code.
-        message = user_message(sale, name)
-        
-        if name == "🇺🇸 Please Don'T Put Me In The Acknowledgements":
-            result = False
-            break
-        
-        # 
-        # "Don't display" checkbox    
-        #
-        
+    name = display_name(sale).replace(nbsp, ' ') # display_name() and user_message() are cached, so calling them several times for each sale is fine.
+    message = user_message(sale, name)
+    
+    if name == "🇺🇸 Please Don'T Put Me In The Acknowledgements":
+        result = False
+    
+    # 
+    # "Don't display" checkbox    
+    #
+    
+    if result == True:
         dont_display_checkbox_is_checked = gumroad_custom_field_content(sale, gumroad_custom_field_labels_dont_display)
         if dont_display_checkbox_is_checked == None: dont_display_checkbox_is_checked = False
         if dont_display_checkbox_is_checked:
             result = False
-            break
-        
-        #
-        # Break
-        #
-        #   (This is a goto statement, not a loop)
-        
-        break
 
     # Log
     if result == False:
@@ -798,11 +922,15 @@ def wants_display(sale):
     # Return
     return result
 
-def user_message(sale, name):
+def compute_user_message(sale, name):
     
     # Notes:
     # - At the time of writing, the name that is being passed in contains &nbsp; chars instead of normal spaces.
     
+    # Normalize name
+    #   Note: We use this in several places below, so we only compute it once.
+    name_normalized = name.replace(nbsp, ' ')
+    
     # Get raw message from sale data
     message = gumroad_custom_field_content(sale, gumroad_custom_field_labels_message)
     if message == None: message = ''
@@ -821,50 +949,58 @@ def user_message(sale, name):
         print("{} payed {} and left message: {}".format(name, sale['formatted_display_price'], message))
     
     # Remove message if it's contained in the name of the purchaser (Because we assume they did that accidentally)
-    if len(message) > 0 and (message.lower() in name.replace(nbsp, ' ').lower()):
+    if len(message) > 0 and (message.lower() in name_normalized.lower()):
         print("{}'s message is contained in their name, so we're filtering it out".format(name))
         message = ''
         
     # Special requests & rules
-    while True:
-        
-        name = name.replace(nbsp, ' ')
-        
-        if name == "🇹🇼 Eugene" and message == "Taiwan no.1":
-            message = ''
-            break
-        
-        # This is not a loop but a a makeshift goto statement
-        break
+    if name_normalized == "🇹🇼 Eugene" and message == "Taiwan no.1":
+        message = ''
     
     # Return
     return message
 
 def gumroad_custom_field_content(sale, custom_field_labels):
     
-    content = None
-    if sale['has_custom_fields']:
-        for label in custom_field_labels:
-            content = sale['custom_fields'].get(label, None)
-            if content != None:
-                break
+    # Notes:
+    # - The labels are tried in order, so the first label that has content wins. (That's why we don't use set intersection here.)
+    
+    if not sale['has_custom_fields']:
+        return None
+    
+    get_custom_field = sale['custom_fields'].get
+    for label in custom_field_labels:
+        content = get_custom_field(label, None)
+        if content != None:
+            return content
 
-    return content
+    return None
+
+whitespace_regex = re.compile(r'\s+') # Matches runs of whitespace. Compiled once, since we use it for every sale.
 
 def normalize_whitespace_for_user_generated(text):
     # Replace all whitespace with a single space
     #   Prevents weird display in case users entered linebreaks or multiple spaces. (This has never happened at the time of writing, so this might be totally unnecessary)
-    text = re.sub(r'\s+', ' ', text)
+    
+    # Fast path
+    #   If the only whitespace in the text is single ascii spaces, there's nothing to replace. (isprintable() is False for any whitespace other than the ascii space.) That's the case for almost all names and messages, so we skip the regex.
+    if text.isprintable() and '  ' not in text:
+        return text
+    
+    text = whitespace_regex.sub(' ', text)
     return text
 
+brace_translation_table = str.maketrans('{}', '()') # Maps curly braces to parentheses. See escape_user_generated().
+
 def escape_user_generated(text):
     
     # In some cases, users used characters that messed up up the markdown generation 
     #   (At the time of writing, there was only one instance of this, where someone used { and })
     
     # Remove { and } because it messes up python string formatting
-    text = text.replace(r'{', r'(')
-    text = text.replace(r'}', r')')
+    #   Note: We replace both in a single pass with translate(), and skip it entirely if there are no braces (which is almost always the case).
+    if '{' in text or '}' in text:
+        text = text.translate(brace_translation_table)
     
     # Escape special characters for markdown
     #   Edit: This is not really necessary. If someone wants to add markdown let them have their fun.
@@ -878,10 +1014,28 @@ def escape_user_generated(text):
 def round_to_multiple(n, multiple, rounding_fn=round):
     return rounding_fn(n / multiple) * multiple
 
+@functools.lru_cache(maxsize=None) # Parsing the babel locale and formatting the date goes through CLDR data, and we need the same few labels for every locale version of the acknowledgements, so we cache it.
+def month_label(year: int, month: int, locale_str: str):
+    locale = mflocales.parse_locale(locale_str)
+    return babel.dates.format_datetime(datetime=datetime.datetime(year, month, 1), format='LLLL yyyy', locale=locale) # See https://babel.pocoo.org/en/latest/dates.html and https://babel.pocoo.org/en/latest/api/dates.html#babel.dates.format_datetime.
+
 #
 # Retrieve/cache gumroad sales
 #
 
+def get_cache_creation_timestamp(cache):
+    
+    # Returns the unix timestamp of when the cache was created.
+    #   Notes:
+    #   - We store the creation time as a unix timestamp, so we can check for expiration without parsing any dates.
+    #   - Caches created by older versions of this script only contain the `created_at` date string, so we fall back to parsing that.
+    
+    created_at_timestamp = cache.get('created_at_timestamp', None)
+    if created_at_timestamp == None:
+        created_at_timestamp = datetime.datetime.strptime(cache['created_at'], gumroad_date_format).replace(tzinfo=datetime.timezone.utc).timestamp() # We don't have to use the gumroad_date_format here, but why not
+    
+    return created_at_timestamp
+
 def get_latest_sales(cache_file, cache_shelf_life, gumroad_api_key, gumroad_api_base, gumroad_sales_api, gumroad_product_ids, no_api):
     
     # Log
@@ -912,8 +1066,7 @@ def get_latest_sales(cache_file, cache_shelf_life, gumroad_api_key, gumroad_api_
             return cache['sales']
         
         # Check cache expiration
-        cache_creation_date = datetime.datetime.strptime(cache['created_at'], gumroad_date_format) # We don't have to use the gumroad_date_format here, but why not
-        cache_is_expired = datetime.datetime.utcnow() > (cache_creation_date + datetime.timedelta(hours=cache_shelf_life))
+        cache_is_expired = time.time() > (get_cache_creation_timestamp(cache) + cache_shelf_life * 60 * 60)
         if cache_is_expired:
             print('The cache is expired. Will load all sales from the Gumroad API...')
             return None
@@ -935,11 +1088,11 @@ def get_latest_sales(cache_file, cache_shelf_life, gumroad_api_key, gumroad_api_
         new_sales = load_sales_from_api(gumroad_api_key, gumroad_api_base, gumroad_sales_api, gumroad_product_ids, after_day=latest_cached_sale_day)
 
         # Find index in cache to stitch together the new sales with the cache
-        stitch_index = -1
+        #   Note: We map the sale ids to their indexes, so we can look up sales in new_sales by id. (setdefault() makes sure we get the first index in case of a duplicate id, like the linear search we used before.)
+        new_sale_indexes = {}
         for i, sale in enumerate(new_sales):
-            if sale['id'] == cached_sales[0]['id']: 
-                stitch_index = i
-                break
+            new_sale_indexes.setdefault(sale['id'], i)
+        stitch_index = new_sale_indexes.get(cached_sales[0]['id'], -1)
         
         # Validate
         #   That the cache and the newly fetched sales can be stitched together
@@ -970,14 +1123,20 @@ def get_latest_sales(cache_file, cache_shelf_life, gumroad_api_key, gumroad_api_
         all_sales = load_sales_from_api(gumroad_api_key, gumroad_api_base, gumroad_sales_api, gumroad_product_ids, after_day=None)
         cache_has_been_cleared = True
 
+    # Check if the cache changed
+    #   Note: If we stitched together the cache and the new sales, but there weren't any new sales, the cache file already contains all the sales, so we don't have to re-serialize them all.
+    cache_is_unchanged = not cache_has_been_cleared and 'sales' in cache and len(all_sales) == len(cache['sales'])
+    
     # Save the new sales to cache
-    if not no_api:
+    #   Note: We write compact json (no spaces after separators) since this file contains thousands of sales and nobody reads it by hand.
+    if not no_api and not cache_is_unchanged:
         new_cache = {
-            'created_at': datetime.datetime.utcnow().strftime(gumroad_date_format) if cache_has_been_cleared else cache['created_at'],
+            'created_at': datetime.datetime.utcnow().strftime(gumroad_date_format) if cache_has_been_cleared else cache['created_at'], # Human-readable version of created_at_timestamp
+            'created_at_timestamp': time.time() if cache_has_been_cleared else get_cache_creation_timestamp(cache),
             'sales': all_sales,
         }
         with open(cache_file, 'w') as file:
-            json.dump(new_cache, file)
+            json.dump(new_cache, file, separators=(',', ':'))
     
     # Return
     return all_sales
@@ -985,10 +1144,15 @@ def get_latest_sales(cache_file, cache_shelf_life, gumroad_api_key, gumroad_api_
 def load_sales_from_api(gumroad_api_key, gumroad_api_base, gumroad_sales_api, gumroad_product_ids, after_day=None):
     
     # Load sales of the gumroad product on `after_day` and later
+    #   Notes:
+    #   - Each product has its own chain of pages, so we load the products in parallel.
+    #   - We use one requests.Session per product, so the connection to the gumroad server is reused between pages instead of doing a new TCP + TLS handshake for every page. (We don't share one session between the threads since requests.Session isn't guaranteed to be thread-safe.)
+    #   - Within a product, we can't load pages in parallel: The gumroad sales API paginates with an opaque `page_key` cursor which we only get from the `next_page_url` of the previous page. There's no total page count or `page=N` parameter that would let us request later pages upfront.
     
-    sales = []
-    
-    for pid in gumroad_product_ids:
+    def load_sales_for_product(pid):
+        
+        sales = []
+        session = requests.Session()
         
         page = 1
         api = gumroad_sales_api
@@ -998,7 +1162,7 @@ def load_sales_from_api(gumroad_api_key, gumroad_api_base, gumroad_sales_api, gu
             
             print('Fetching sales for product {} after date {} (page {})...'.format(pid, after_day, page))
             
-            response = requests.get(
+            response = session.get(
                 gumroad_api_base + api, 
                 headers={
                     'Content-Type': 'application/x-www-form-urlencoded'
@@ -1036,11 +1200,23 @@ def load_sales_from_api(gumroad_api_key, gumroad_api_base, gumroad_sales_api, gu
             else:
                 break
             
-            page += 1    
-         
+            page += 1
+        
+        session.close()
+        return sales
+    
+    # Load all products
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(gumroad_product_ids)) as executor:
+        sales_per_product = list(executor.map(load_sales_for_product, gumroad_product_ids)) # Note: executor.map() keeps the order of gumroad_product_ids, so the result is the same as loading the products one after another.
+    
+    sales = []
+    for product_sales in sales_per_product:
+        sales += product_sales
+    
     # Sort sales by date
     #   I feel like the Gumroad api should already return stuff sorted by data but it doesn't seem to work at least as I'm using it at the time of writing
-    sales.sort(key=(lambda sale: datetime.datetime.strptime(sale['created_at'], gumroad_date_format)), reverse=True)
+    #   Note: The date strings have the fixed-width, zero-padded gumroad_date_format (which goes from the largest to the smallest unit, all in UTC), so sorting them as strings gives the same order as parsing and sorting the dates. That way we don't have to call strptime() for every sale.
+    sales.sort(key=(lambda sale: sale['created_at']), reverse=True)
     
     # Return 
     return sales
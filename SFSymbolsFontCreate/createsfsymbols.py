@@ -1,8 +1,5 @@
 
-import shlex
-import mfutils
 import os
-import shutil
 import tempfile
 
 # Handle CFF Table
@@ -10,9 +7,11 @@ from fontTools.cffLib import CFFFontSet
 from fontTools.cffLib import TopDict
 
 # Handl eTTF Table
-from fontTools.ttLib import TTFont
 from fontTools.ttLib.tables._n_a_m_e import NameRecord
 
+# Create subset
+from fontTools.subset import Options, Subsetter, load_font, save_font
+
 """
 
 This script generates a subset font of Apple's SF Pro font.
@@ -93,20 +92,25 @@ def main():
     # Convert to unicode
     unicodes = [ord(s) for s in symbols]
     
-    # Convert to fonttools input format
-    unicodes_arg = ",".join(map(lambda c: hex(c)[2:], unicodes)) # [2:] cuts off the 0x prefix of the hex numbers
-
     # Get output path
     tempdir = tempfile.gettempdir()
     output_file_path = os.path.join(tempdir, output_file_name)
 
-    # Validate that fonttools is installed
-    assert shutil.which('fonttools') is not None, f"This script requires fonttools which is not available. To install fonttools run: pip install fonttools"
+    # Create a subset
+    #   Not totally sure what I'm doing with the options
+    #   Notes: 
+    #   - We use fonttools' subsetter in-process (instead of calling the `fonttools subset` clt) so we don't have to start a second python process, and we don't have to write the subset font to disk and then load it again for the edits below.
+    #   - The options are the same as the clt args we used to pass: `--glyph-names --no-ignore-missing-unicodes --no-ignore-missing-glyphs`. load_font() and save_font() are what the clt uses internally.
+    #       (Unlike the clt, we turn bounding box and timestamp recalculation back on before saving. See below.)
+    options = Options()
+    options.glyph_names = True
+    options.ignore_missing_unicodes = False
+    options.ignore_missing_glyphs = False
     
-    # Call fonttools
-    #   Create a subset
-    #   Not totally sure what I'm doing with the args
-    mfutils.runclt(f"fonttools subset {shlex.quote(sf_file_path)} --unicodes={unicodes_arg} --output-file={shlex.quote(output_file_path)} --glyph-names --no-ignore-missing-unicodes --no-ignore-missing-glyphs", print_live_output=True)
+    ttFont = load_font(sf_file_path, options)
+    subsetter = Subsetter(options=options)
+    subsetter.populate(unicodes=unicodes)
+    subsetter.subset(ttFont)
 
     # Update the nameTable records for the font
     #   Why update all the names? 
@@ -116,12 +120,19 @@ def main():
     #   - Python debugger ('CFF ' table)
     #   - Fonttools example code (general renaming usage): https://github.com/fonttools/fonttools/blob/main/Snippets/rename-fonts.py
 
-    ttFont = TTFont(output_file_path)
     name_table = ttFont["name"] 
     name_records: list[NameRecord] = name_table.names # What is this api
 
     def append_to_record(record: NameRecord, appendix: str):
-        record.string = (record.toUnicode() + appendix).encode('utf-16-be')
+        
+        # Notes:
+        # - Records on the Unicode (0) and Windows (3) platforms are already stored as utf-16-be bytes, so we can just append the encoded appendix, instead of decoding the whole record and then encoding it again.
+        # - Records on other platforms (e.g. Mac (1), which uses MacRoman) are decoded first, and then stored as utf-16-be like before.
+        
+        if record.platformID in (0, 3) and isinstance(record.string, bytes):
+            record.string = record.string + appendix.encode('utf-16-be')
+        else:
+            record.string = (record.toUnicode() + appendix).encode('utf-16-be')
 
     append_to_record(name_records[0], " Please don't sue me Apple.")                # Update Copyright notice "© 2015-2024 Apple ..."  || Note1: FontForge complains that the family name is too long for some versions of Windows, if we go over 31 char limit || Note2: We put praying hands emojis here but they are stripped from the output
     append_to_record(name_records[1], " but different")                             # Update Font Family name "SF Pro Text"
@@ -153,7 +164,10 @@ def main():
         cf_set.fontNames[i] = postscript_name_for_output_font                   # Update postscript name "SFProText-Regular" .  Note: Need to update this weird way (not through the topDict or nameRecord) to show up in FontForge.
         
     # Write to file
-    ttFont.save(output_file_path)
+    #   Note: load_font() turns off recalculating the bounding boxes and the `head.modified` timestamp on save. We turn both back on, like a plain TTFont() does, so the bounding boxes fit the subset glyphs and the timestamp is updated.
+    ttFont.recalcBBoxes = True
+    ttFont.recalcTimestamp = True
+    save_font(ttFont, output_file_path, options)
     ttFont.close()
     
     # Print success
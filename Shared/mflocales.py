@@ -49,9 +49,12 @@ import babel
 # stdlib & local imports
 import json
 from collections import defaultdict
+from collections import Counter
 import re
 import os
+import functools
 
+import babel.core
 import babel.languages
 import babel.lists
 import mfutils
@@ -111,6 +114,11 @@ language_code_to_emoji_flag_map = {
     'ko': '🇰🇷',     # korean -> south korea    
 }
 
+language_code_to_fallback_country_code_map = { # Derived from language_code_to_emoji_flag_map once at import, so locale_to_country_code() doesn't have to decode the flag's regional indicator symbols on every call. (Same math as flag_to_country_code(), which is defined further down.)
+    language_code: ''.join(chr(ord(c) - 127397) for c in emoji_flag)
+    for language_code, emoji_flag in language_code_to_emoji_flag_map.items()
+}
+
 language_name_override_map = {
     'en': {
         'zh-HK': 'Chinese (Honk Kong)', # I think this is unused?
@@ -137,14 +145,35 @@ def sorted_locales(locales, source_locale):
     - Sorts all the locales alphabetically by their display name, but puts the development aka source_locale (en) as the first language.
     - We plan to use this sorting whenever there's a language picker. (On the website and in the markdown language pickers)
     """
-    smallest_char = "\u0000"
-    result = sorted(locales, key=lambda l: smallest_char if l == source_locale else locale_to_language_name(l, l, False))
+    
+    # Notes:
+    # - sorted() computes the key once per locale (not once per comparison), and locale_to_language_name() is cached, so each display name is only looked up once per process.
+    # - The (0, '') tuple puts the source_locale first, since it's smaller than any (1, <display name>) tuple.
+    # - We compare the display names as-is (not casefolded), so the order stays the same as on the website.
+    # - The result only depends on the locales and the source_locale, which are the same for every document we build, so we cache it. 
+    #       (If the display names change at runtime, e.g. because you edited language_name_override_map, call sorted_locales_cached.cache_clear() and locale_to_language_name.cache_clear())
+    
+    result = list(sorted_locales_cached(tuple(locales), source_locale)) # Copy into a new list, so callers can't mutate the cached result
     return result
 
-def get_localization_progress(xcstring_objects: list[dict], translation_locales: list[str]) -> dict:
+@functools.lru_cache(maxsize=32) # The locales need to be passed in as a tuple, since lists aren't hashable.
+def sorted_locales_cached(locales: tuple[str], source_locale: str) -> tuple[str]:
+    return tuple(sorted(locales, key=lambda l: (0, '') if l == source_locale else (1, locale_to_language_name(l, l, False))))
+
+# Define states
+#   For get_localization_progress()
+is_translated_states = ['translated']
+should_translate_states = ['new', 'needs_review', 'mmf_indeterminate']
+should_not_translate_states = ['stale', 'mmf_dont_translate']           # (Stale means that the kv-pair is superfluous and doesn't occur in the base file/source code file afaik, therefore it's not part of 'to_translate' set)
+all_states = is_translated_states + should_translate_states + should_not_translate_states
+should_translate_states_set = frozenset(should_translate_states)    # For fast membership checks inside the loops over all strings and locales
+all_states_set = frozenset(all_states)
+
+def get_localization_progress(xcstring_objects: list[dict | str], translation_locales: list[str]) -> dict:
     
     """
     - You pass in a list of xcstrings objects, each of which is the content of an xcstrings parsed using json.load()
+        - Instead of an xcstrings object, you can also pass in the path to an xcstrings file. Then we load the file only while counting its strings, so only one parsed file has to be in memory at a time.
     - The return is a dict with structure:
         {
             '<locale>': {
@@ -155,43 +184,101 @@ def get_localization_progress(xcstring_objects: list[dict], translation_locales:
         }
         
         - Note that strings which are marked as 'stale' in the development language are not considered 'strings that should be translated'. Since the 'stale' state means that the string isn't used in the source files.
+        - If you're already iterating over all the strings anyways, you can use get_localization_states() and get_localization_progress_from_state_counts() to compute the progress in the same pass. (That's what buildstrings.py does.)
+        - If you want to count the strings of several xcstrings files at different points in time, you can use count_localization_states() and get_localization_progress_from_state_counter() instead. (That's what uploadstrings.py does.)
+    """
+    
+    state_counts, missing_keys = count_localization_states(xcstring_objects, translation_locales)
+    return get_localization_progress_from_state_counter(state_counts, missing_keys)
+
+def count_localization_states(xcstring_objects: list[dict | str], translation_locales: list[str], state_counts: Counter | None = None, missing_keys: dict[str, list] | None = None) -> tuple[Counter, dict[str, list]]:
+    
     """
+    Counts how many times each translation state appears for each locale, and collects the keys that are missing a translation for each locale.
+        `xcstring_objects` can contain xcstrings objects or paths to xcstrings files, just like for get_localization_progress().
     
-    # Define states
-    is_translated_states = ['translated']
-    should_translate_states = ['new', 'needs_review', 'mmf_indeterminate']
-    should_not_translate_states = ['stale', 'mmf_dont_translate']           # (Stale means that the kv-pair is superfluous and doesn't occur in the base file/source code file afaik, therefore it's not part of 'to_translate' set)
-    all_states = is_translated_states + should_translate_states + should_not_translate_states
+    -> Returns a tuple with structure: (Counter({ (locale, state): count }), { locale: [<missing keys>] })
+    
+    Pass the result of a previous call in as `state_counts` and `missing_keys` to keep counting into it.
+    """
     
     # Create an overview of how many times each translation state appears for each language
+    #   Note: We count into a flat Counter keyed by (locale, state) and build the nested dict afterwards. (Instead of counting into nested defaultdicts and then converting them with a json round-trip.)
     
-    localization_state_counts = defaultdict(lambda: defaultdict(lambda: 0))
-    missing_keys: dict[str, list] = defaultdict(lambda: [])
+    if state_counts == None: state_counts = Counter()
+    if missing_keys == None: missing_keys = defaultdict(lambda: [])
     
     for xcstring_object in xcstring_objects:
+        
+        # Load file
+        #   Note: We load the files one-by-one while counting, so only one parsed file has to be in memory at a time.
+        if isinstance(xcstring_object, str):
+            xcstring_object = mfutils.read_xcstrings_file(xcstring_object)
+        
         for key, string_dict in xcstring_object['strings'].items():
             
-            for locale in translation_locales:
-                
-                # Get state
-                s = None
-                if not string_dict.get('shouldTranslate', True):
-                    s = 'mmf_dont_translate'
-                else:                
-                    s = string_dict.get('localizations', {}).get(locale, {}).get('stringUnit', {}).get('state', 'mmf_indeterminate')
-                    
-                # Validate
-                assert(s in all_states)    
+            # Get states
+            #   Note: We get the states for all locales at once, so the locale-independent lookups only happen once per string.
+            states = get_localization_states(string_dict, translation_locales)
+            
+            for locale, s in zip(translation_locales, states):
 
                 # Append to result1
-                localization_state_counts[locale][s] += 1
+                state_counts[(locale, s)] += 1
                 
                 # Append to result2
-                if s in should_translate_states:
+                if s in should_translate_states_set:
                     missing_keys[locale].append(key)
-                    
     
-    localization_state_counts = json.loads(json.dumps(localization_state_counts, ensure_ascii=False)) # Convert nested defaultdict to normal dict - which prints in a pretty way (Update: Why do we need it to print pretty? Update2: Should we use ensure_ascii?)
+    # Return
+    return state_counts, missing_keys
+
+def get_localization_progress_from_state_counter(state_counts: Counter, missing_keys: dict[str, list]) -> dict:
+    
+    """
+    Turns the result of count_localization_states() into the result of get_localization_progress()
+    """
+    
+    localization_state_counts: dict[str, dict[str, int]] = {}
+    for (locale, s), count in state_counts.items():
+        localization_state_counts.setdefault(locale, {})[s] = count
+    
+    return get_localization_progress_from_state_counts(localization_state_counts, missing_keys)
+
+def get_localization_states(string_dict: dict, locales: list[str]) -> list[str]:
+    
+    """
+    Returns the translation state of a string for each of the `locales`. (Each one of the `all_states`)
+        `string_dict` is one of the values inside the 'strings' dict of an xcstrings object.
+        We get the states for all locales at once, so the locale-independent lookups on `string_dict` only happen once.
+    """
+    
+    # Get states
+    if not string_dict.get('shouldTranslate', True):
+        return ['mmf_dont_translate'] * len(locales)
+    
+    #   Note: We check for missing dicts explicitly instead of chaining `.get(..., {})` calls, so we don't create throwaway empty dicts for every missing translation.
+    localizations = string_dict.get('localizations')
+    if localizations == None:
+        return ['mmf_indeterminate'] * len(locales)
+    
+    result = []
+    for locale in locales:
+        localization = localizations.get(locale)
+        string_unit = localization.get('stringUnit') if localization != None else None
+        result.append(string_unit.get('state', 'mmf_indeterminate') if string_unit != None else 'mmf_indeterminate')
+    
+    # Validate
+    assert(all_states_set.issuperset(result))
+    
+    # Return
+    return result
+
+def get_localization_progress_from_state_counts(localization_state_counts: dict[str, dict[str, int]], missing_keys: dict[str, list]) -> dict:
+    
+    """
+    Turns the counts of how many times each translation state appears for each locale into the result of get_localization_progress()
+    """
     
     # Get translation progress for each language
     #   Notes: 
@@ -199,8 +286,8 @@ def get_localization_progress(xcstring_objects: list[dict], translation_locales:
     
     localization_progress = {}
     for locale, state_counts in localization_state_counts.items():
-        translated_count = sum([state_counts.get(s, 0) for s in is_translated_states])
-        to_translate_count = sum([state_counts.get(s, 0) for s in (is_translated_states + should_translate_states)])
+        translated_count = sum(state_counts.get(s, 0) for s in is_translated_states)
+        to_translate_count = translated_count + sum(state_counts.get(s, 0) for s in should_translate_states)
         localization_progress[locale] = {'translated': translated_count, 'to_translate': to_translate_count, 'percentage': translated_count/to_translate_count, 'missing_keys:': missing_keys }
 
     # Return
@@ -222,30 +309,86 @@ def get_translation(xcstrings: dict, key: str, preferred_locale: str, fall_back_
     - The `xcstrings` dict argument is expected to be the content of an .xcstrings file which has been loaded using json.load()
     - The fall_back_to_next_best_language option might not make sense to use, if you have a string-retrieval system at runtime that implements a fallback. 
         I thought that nuxt-i18n had this? But I think we still decided to use the fall_back_to_next_best_language option for that. Not sure why anymore.
+    - If you need the translations for several locales, use get_translations() instead.
+    """
+    
+    return get_translations(xcstrings, key, [preferred_locale], fall_back_to_next_best_language)[preferred_locale]
+
+def build_fallback_chains(locales: list[str], source_locale: str) -> dict[str, list[str]]:
+    
+    """
+    -> Returns a dict with structure: { locale: [<locales to try, in order, when looking up a translation for `locale`>] }
+    
+    Pass the result to get_translations() when looking up many keys for the same set of locales. That way we only have to compute the chains once per build instead of once per lookup.
+    
+    Notes:
+    - The chains mirror what babel.negotiate_locale() does inside get_translations(): First try the locale itself, then the source_locale. 
+        (babel.negotiate_locale() also tries aliases and the language part of the locale, but it only does that for `_`-separated locales, and Apple/Xcode uses `-` as a separator, so that never applies to us.)
+    - If none of the locales in a chain is available, get_translations() still falls back to babel.negotiate_locale().
+    """
+    
+    result = {}
+    for locale in locales:
+        result[locale] = [locale] if locale == source_locale else [locale, source_locale]
+    
+    return result
+
+def get_translations(xcstrings: dict, key: str, preferred_locales: list[str], fall_back_to_next_best_language: bool = True, fallback_chains: dict[str, list[str]] | None = None) -> dict[str, tuple[str, str]]:
+    
+    """
+    -> Like get_translation(), but retrieves the translations of key `key` for all the `preferred_locales` at once.
+    
+    -> Returns a dict with structure: { preferred_locale: (translation, locale_of_the_translation) }
+    
+    Notes:
+    - We look up the string and its available locales only once, and then negotiate the best locale for each of the `preferred_locales`. 
+        That's cheaper than calling get_translation() once per locale, when compiling the strings for all locales. (Which is what buildstrings.py does.)
+    - You can pass in the result of build_fallback_chains() as `fallback_chains`. Then we simply walk the chain for each locale instead of negotiating with babel.
     """
     
     assert xcstrings['version'] == '1.0' # Maybe we should also assert this in other places where we parse .xcstrings files
     
     source_locale = xcstrings['sourceLanguage']
     localizations = xcstrings['strings'][key]['localizations']
+    available_locales = list(localizations.keys())
     
-    translation = None
-    translation_locale = None
+    result = {}
     
-    if fall_back_to_next_best_language:
+    for preferred_locale in preferred_locales:
         
-        available_locales = localizations.keys()
-        preferred_locales = [preferred_locale, source_locale, *available_locales] # The leftmost is the most preferred in babel.negotiate_locale
-        translation_locale = babel.negotiate_locale(preferred_locales, available_locales) # What's the difference to babel.Locale.negotiate()?
+        translation = None
+        translation_locale = None
         
-        translation = localizations[translation_locale]['stringUnit']['value']
-        assert translation != None
-        # assert len(translation) != 0 # Not asserting this since sometimes translations can be empty strings
-    else:
-        translation_locale = preferred_locale
-        translation = localizations.get(translation_locale, {}).get('stringUnit', {}).get('value', '') # Why are we returning emptystring instead of None?
+        if fall_back_to_next_best_language:
+            
+            # Fast path for when the preferred locale is directly available
+            #   babel.negotiate_locale() would always pick the preferred locale here, since it's the first locale we pass in. So we don't need to negotiate or walk a chain.
+            #   This is the common case, since most strings are translated into most locales.
+            if preferred_locale in localizations:
+                translation_locale = preferred_locale
+            
+            # Walk the precomputed fallback chain
+            elif fallback_chains != None:
+                fallback_chain = fallback_chains[preferred_locale]
+                assert fallback_chain[-1] == source_locale, f"The fallback chain {fallback_chain} doesn't end in the source locale of the xcstrings file ({source_locale})"
+                translation_locale = next((l for l in fallback_chain if l in localizations), None)
+            
+            # Negotiate with babel
+            if translation_locale == None:
+                negotiation_locales = [preferred_locale, source_locale, *available_locales] # The leftmost is the most preferred in babel.negotiate_locale
+                translation_locale = babel.negotiate_locale(negotiation_locales, available_locales) # What's the difference to babel.Locale.negotiate()?
+                if translation_locale == None:
+                    raise LookupError(f"Couldn't find any translation for key '{key}' to fall back to. Available locales: {available_locales}") # This only happens if the string has no localizations at all.
+            
+            translation = localizations[translation_locale]['stringUnit']['value']
+            # assert len(translation) != 0 # Not asserting this since sometimes translations can be empty strings
+        else:
+            translation_locale = preferred_locale
+            translation = localizations.get(translation_locale, {}).get('stringUnit', {}).get('value', '') # Why are we returning emptystring instead of None?
+        
+        result[preferred_locale] = (translation, translation_locale)
     
-    return translation, translation_locale
+    return result
         
 
 def make_custom_xcstrings_visible_to_xcodebuild(path_to_xcodeproj: str, custom_xcstrings_paths: list) -> dict:
@@ -284,11 +427,10 @@ def make_custom_xcstrings_visible_to_xcodebuild(path_to_xcodeproj: str, custom_x
     #   - You can't seem to insert values into the proj file directly using plutil. This seems to be possible with PlistBuddy but that will 
     #       convert the proj file into xml. So just converting to json to begin with seems to be easiest. 
     #       See https://stackoverflow.com/questions/32133576/what-tools-support-editing-project-pbxproj-files
-    
-    mfutils.runCLT(f'plutil -convert json "{pbxproj_path}"')
+    #   - We read the converted json from stdout (`-o -`) instead of converting in place and then `cat`ing the file. That's one subprocess instead of two, and we write the json back to the file below anyways.
     
     # Load xcode project json
-    pbxproject_json = json.loads(mfutils.runCLT(f"cat '{pbxproj_path}'").stdout)
+    pbxproject_json = mfutils.parse_json(mfutils.runclt_bytes(['plutil', '-convert', 'json', '-o', '-', pbxproj_path]))
         
     for xcstrings_path in custom_xcstrings_paths:
         # Find xcstrings file
@@ -358,11 +500,9 @@ def undo_make_custom_xcstrings_visible_to_xcodebuild(undo_payload):
     build_file_uuid = undo_payload['inserted_build_file_uuid']
     resources_build_phase_uuid = undo_payload['resources_build_phase_uuid']
     
-    # Convert project to json
-    mfutils.runCLT(f'plutil -convert json "{pbxproj_path}"')
-    
-    # Load json
-    pbxproject_json = json.loads(mfutils.runCLT(f"cat '{pbxproj_path}'").stdout)
+    # Load project as json
+    #   `-o -` prints to stdout instead of converting the file in place, so we don't need a separate `cat`.
+    pbxproject_json = mfutils.parse_json(mfutils.runclt_bytes(['plutil', '-convert', 'json', '-o', '-', pbxproj_path]))
     
     # Remove build_file_object
     del pbxproject_json['objects'][build_file_uuid]
@@ -385,7 +525,7 @@ def find_xcode_project_locales(path_to_xcodeproj) -> tuple[str, list[str]]:
     """
     
     # Load xcodeproj json
-    pbxproject_json = json.loads(mfutils.runclt(['plutil', '-convert', 'json', '-r', '-o', '-', f'{path_to_xcodeproj}/project.pbxproj']))    # -r puts linebreaks into the json which makes it human readable, but is unnecessary here. `-o -` returns to stdout, instead of converting in place
+    pbxproject_json = mfutils.parse_json(mfutils.runclt_bytes(['plutil', '-convert', 'json', '-o', '-', f'{path_to_xcodeproj}/project.pbxproj']))    # `-o -` returns to stdout, instead of converting in place. (We don't pass -r, which puts linebreaks into the json to make it human readable, since that's unnecessary here.) We parse the stdout bytes directly, without decoding them to a str first.
     
     # Find locales in xcodeproj
     development_locale = None
@@ -408,6 +548,11 @@ def find_xcode_project_locales(path_to_xcodeproj) -> tuple[str, list[str]]:
     # Return
     return development_locale, translation_locales
 
+@functools.lru_cache(maxsize=512) # babel.Locale.parse() is slow, and we parse the same few locales over and over, so we cache the Locale objects. (Don't mutate the returned objects.)
+def parse_locale(locale_str: str) -> babel.Locale:
+    return babel.Locale.parse(locale_str, sep='-')
+
+@functools.lru_cache(maxsize=1024) # Babel lookups are slow and we request the same names over and over. E.g. for sorting and for every language picker in every document. 
 def locale_to_language_name(locale_str: str, destination_locale_str: str = 'en', include_flag = False):
     
     # Query override map
@@ -416,13 +561,18 @@ def locale_to_language_name(locale_str: str, destination_locale_str: str = 'en',
     if language_name == None:
         
         # Query babel        
-        locale_obj = babel.Locale.parse(locale_str, sep='-')
-        destination_locale_obj = babel.Locale.parse(destination_locale_str, sep='-')
+        locale_obj = parse_locale(locale_str)
+        destination_locale_obj = parse_locale(destination_locale_str)
         
         language_name = locale_obj.get_display_name(destination_locale_obj) # .display_name is the native name, .english_name is the english name
     
     # Capitalize
-    language_name = language_name[0].upper() + language_name[1:]
+    #   Notes: 
+    #   - We don't use str.capitalize() since that would lowercase the rest of the name.
+    #   - We skip rebuilding the string if it's already capitalized (Babel's names often are). This only runs once per cache miss anyways, since this function is cached.
+    #   - [:1] instead of [0] so we don't crash on empty names.
+    if not language_name[:1].isupper():
+        language_name = language_name[:1].upper() + language_name[1:]
     
     # Add flag emoji
     if include_flag:
@@ -433,25 +583,36 @@ def locale_to_language_name(locale_str: str, destination_locale_str: str = 'en',
     return language_name
 
 
+@functools.lru_cache(maxsize=512) # Pure function of the locale string, and called for every locale over and over.
 def locale_to_country_code(locale: str) -> str:
     
     # Get locale obj
-    locale_obj = babel.Locale.parse(locale, sep='-')
+    locale_obj = parse_locale(locale)
 
     # Get country code directly from locale
     country_code = locale_obj.territory
     if country_code != None: 
         return country_code
 
-    # Get country code from emoji flag
-    language_code = locale_obj.language
-    emoji_flag = language_code_to_emoji_flag_map.get(language_code, None)
-    if emoji_flag == None: return None
-
-    country_code = flag_to_country_code(emoji_flag)
-
+    # Get fallback country code for the language
+    #   Our hand-curated map takes precedence, since it encodes our preferences (e.g. english -> uk).
+    country_code = language_code_to_fallback_country_code_map.get(locale_obj.language, None)
+    if country_code != None:
+        return country_code
+    
+    # Get fallback country code from babel
+    #   Notes: 
+    #   - For languages that aren't in our map, we use the territory that the CLDR 'likely subtags' data associates with the language. (E.g. 'ha' -> 'ha_Latn_NG' -> 'NG')
+    #   - We only accept 2-letter country codes, since the likely territory is sometimes a region like '001' (world), for which there's no flag.
+    #   - This is cheap enough to do lazily here instead of at import, since this function is cached.
+    likely_subtags = babel.core.get_global('likely_subtags').get(locale_obj.language, None)
+    if likely_subtags != None:
+        country_code = babel.core.parse_locale(likely_subtags)[1]
+        if country_code != None and len(country_code) == 2 and country_code.isalpha():
+            return country_code
+    
     # Return
-    return country_code
+    return None
 
 def country_code_to_flag(country_code):
     return ''.join(chr(ord(c) + 127397) for c in country_code.upper())
@@ -459,19 +620,14 @@ def country_code_to_flag(country_code):
 def flag_to_country_code(emoji_flag):
     return ''.join(chr(ord(c) - 127397) for c in emoji_flag)
 
+@functools.lru_cache(maxsize=512) # Pure function of the locale string, and called for every entry of every language picker.
 def locale_to_flag_emoji(locale_str: str):
     
-    # Parse locale_str
-    locale = babel.Locale.parse(locale_str, sep='-')
-    
     # Get flag from country code
-    if locale.territory:
-        return country_code_to_flag(locale.territory)
-    
-    # Fallback
-    flag = language_code_to_emoji_flag_map.get(locale.language, None)
-    if flag:
-        return flag
+    #   Note: locale_to_country_code() falls back to the country codes from language_code_to_emoji_flag_map and then to babel, if the locale doesn't specify a country.
+    country_code = locale_to_country_code(locale_str)
+    if country_code != None:
+        return country_code_to_flag(country_code)
     
     # Fallback to Unicode 'Replacement Character' (Missing emoji symbol/questionmark-in-rectangle symbol)
     return "�" 
@@ -502,7 +658,7 @@ def continent_code_to_continent_name(continent_code: str, destination_locale_str
     _name = None
 
     # Create a Locale object for the destination language
-    destination_locale_obj = babel.Locale.parse(destination_locale_str, sep='-')
+    destination_locale_obj = parse_locale(destination_locale_str)
         
     # Get the localized continent name
     continent_name = destination_locale_obj.territories.get(continent_code)
@@ -561,6 +717,7 @@ def add_index_prefix_to_key(key: str, key_index: int, max_index: int) -> str:
 
     return result
 
+@functools.lru_cache(maxsize=None) # This is pure and gets called for every key for every document/locale, so we cache it.
 def remove_index_prefix_from_key(key: str) -> str:
     
     result = None
@@ -575,12 +732,41 @@ def remove_index_prefix_from_key(key: str) -> str:
 
     return result
 
-
-def get_localizable_strings_from_markdown(md_string: str):
+# Return types of the localizable strings extraction functions
+#   Notes:
+#   - These are defined at module level instead of inside the functions that return them, so the dataclass machinery only runs once at import instead of on every call.
+#   - frozen and slots since we never mutate these after creating them, and slots makes the instances smaller.
+
+@dataclass(frozen=True, slots=True)
+class MarkdownLocalizedStringData:
+    condition: str | None       # A string specifying the condition under which to include this localizable string in the rendered document (Instead of this we should probably just use our more powerful jinja-style {% if blocks %})
+    key: str                    # a.key.that identifies the string across different languages
+    key_with_index_prefix: str  # Key that looks like 001:some.key or 002:some.other.key, etc. Where we call '002:' the 'index_prefix'. The index tells us the order that the keys appear in the template.
+    value: str                  # The user-facing string in the development language (english). The goal is to translate this string into differnt languages.
+    comment: str | None         # A comment providing context for translators.
+    full_match: str             # The entire substring of the .md file that we extracted the key, value, comment (and condition) from. Replace all full_matches with translated strings to localize the .md file.
+
+@dataclass(frozen=True, slots=True)
+class SourceCodeLocalizedStringData:
+    key: str                    # a.key.that identifies the string across different languages
+    key_with_index_prefix: str  # Key that looks like 001:some.key or 002:some.other.key, etc. Where we call '002:' the 'index_prefix'. The index tells us the order that the keys appear in the source code (usually .vue files).
+    value: str                  # English UI String
+    comment: str | None         # A comment providing context for translators.
+    full_match: str             # The entire substring of the source file that we extracted the key, and comment from. Replace all full_matches with translated strings to localize the .md file.
+
+markdown_inline_regex = re.compile(r"\{\{(.*?)\|\|(.*?)\|\|(.*?)\}\}") # Matches the `inline syntax` of localizable strings in .md files. See get_localizable_strings_from_markdown(). || r makes it so \ is treated as a literal character and so we don't have to double escape everything
+markdown_block_regex = re.compile(r"```(?:\n\s*?if:\s*(.*?)\s*)?\n\s*?key:\s*(.*?)\s*\n\s*?```\n\s*(^.*?$)\s*```\n\s*?comment:\s*?(.*?)\s*\n\s*?```", re.DOTALL | re.MULTILINE) # Matches the `block syntax` of localizable strings in .md files. See get_localizable_strings_from_markdown().
+markdown_inline_syntax_tokens = (
+    '}}',   # Protect against matching past the first occurrence of }}
+    '||',   # Protect against ? - this is weird
+    '{{',   # Protect against ? - this is also weird
+) # The localizable strings we extract from .md files shouldn't contain these. See get_localizable_strings_from_markdown().
+
+def get_localizable_strings_from_markdown(md_string: str) -> list[MarkdownLocalizedStringData]:
 
 
     """
-    Returns a list of LocalizedStringData instances extracted from the `md_string`.
+    Returns a list of MarkdownLocalizedStringData instances extracted from the `md_string`.
         
     The localizable strings inside the .md file can be specified in 2 ways: Using the `inline syntax` or the `block syntax`.
     
@@ -661,31 +847,24 @@ def get_localizable_strings_from_markdown(md_string: str):
 
     """
 
-    # Declare return type
-    @dataclass
-    class LocalizedStringData:
-        condition: str | None       # A string specifying the condition under which to include this localizable string in the rendered document (Instead of this we should probably just use our more powerful jinja-style {% if blocks %})
-        key: str                    # a.key.that identifies the string across different languages
-        key_with_index_prefix: str  # Key that looks like 001:some.key or 002:some.other.key, etc. Where we call '002:' the 'index_prefix'. The index tells us the order that the keys appear in the template.
-        value: str                  # The user-facing string in the development language (english). The goal is to translate this string into differnt languages.
-        comment: str | None         # A comment providing context for translators.
-        full_match: str             # The entire substring of the .md file that we extracted the key, value, comment (and condition) from. Replace all full_matches with translated strings to localize the .md file.
-
     # Extract translatable strings with inline syntax
 
-    inline_regex = r"\{\{(.*?)\|\|(.*?)\|\|(.*?)\}\}"           # r makes it so \ is treated as a literal character and so we don't have to double escape everything
-    inline_matches = re.finditer(inline_regex, md_string)
+    inline_matches = markdown_inline_regex.finditer(md_string)
     
     # Extract translatable strings with block syntax
     
-    block_regex = r"```(?:\n\s*?if:\s*(.*?)\s*)?\n\s*?key:\s*(.*?)\s*\n\s*?```\n\s*(^.*?$)\s*```\n\s*?comment:\s*?(.*?)\s*\n\s*?```"
-    block_matches = re.finditer(block_regex, md_string, re.DOTALL | re.MULTILINE)
+    #   Notes:
+    #   - We keep using the regex here instead of a hand-written line-by-line parser. The regex defines what the block syntax is (e.g. how blank lines and indentation around the value are handled, and which closing fence ends the value), and a separate parser would be very easy to get subtly out of sync with it. 
+    #   - The regex engine finds candidate blocks by scanning for the literal ``` fence, so it only does real work around fences. Documents without any block syntax skip the regex entirely.
+    
+    block_matches = markdown_block_regex.finditer(md_string) if ('```' in md_string and 'key:' in md_string) else []
 
     # Assemble result
 
     all_matches = list(map(lambda m: ('inline', m), inline_matches)) + list(map(lambda m: ('block', m), block_matches))
     
-    result: list[LocalizedStringData] = []
+    result: list[MarkdownLocalizedStringData] = []
+    seen_keys = set() # For guarding duplicate keys without rescanning `result` for every match
         
     for i, match in enumerate(all_matches):
         
@@ -710,10 +889,9 @@ def get_localizable_strings_from_markdown(md_string: str):
         assert ' ' not in key, f'key contains space: {key}' # I don't think keys are supposed to contain spaces in objc and swift. We're trying to adhere to the standard xcode way of doing things. 
         assert len(key) > 0   # We need a key to do anything useful
         assert len(value) > 0 # English ui strings are defined directly in the markdown file - don't think this should be empty
-        for st in [condition or '', value, key, comment]:
-            assert r'}}' not in st # Protect against matching past the first occurrence of }}
-            assert r'||' not in st # Protect against ? - this is weird
-            assert r'{{' not in st # Protect against ? - this is also weird
+        for st in (condition or '', value, key, comment):
+            for token in markdown_inline_syntax_tokens:
+                assert token not in st, f"Found '{token}' inside a localizable string from the md file: '{st}'"
         # TODO: Maybe somehow protect against over matching on block syntax, too
         
         # Strip results
@@ -723,22 +901,23 @@ def get_localizable_strings_from_markdown(md_string: str):
         comment = comment.strip() 
 
         # Guard duplicate keys
-        assert all(key != k.key for k in result), f"There's a duplicate key '{key}' in the md file."
+        assert key not in seen_keys, f"There's a duplicate key '{key}' in the md file."
+        seen_keys.add(key)
 
         # Get key_with_index_prefix
         key_with_index_prefix = add_index_prefix_to_key(key, i, len(all_matches) - 1)
         
         # Store
-        result.append(LocalizedStringData(condition, key, key_with_index_prefix, value, comment, full_match))
+        result.append(MarkdownLocalizedStringData(condition, key, key_with_index_prefix, value, comment, full_match))
     
     # Return
     
     return result
 
-def get_localizable_strings_from_website_source_code(source_code: str):
+def get_localizable_strings_from_website_source_code(source_code: str) -> list[SourceCodeLocalizedStringData]:
 
     """
-    Returns a list of LocalizedStringData instances extracted from the `source_code` string.
+    Returns a list of SourceCodeLocalizedStringData instances extracted from the `source_code` string.
 
     We do this by looking for invocations of the ```MFLocalizedString(<key>, <comment>)``` function in the source code, and returning the <key> <comment> pairs we find in a list.
 
@@ -747,15 +926,6 @@ def get_localizable_strings_from_website_source_code(source_code: str):
     - This function is very similar to the get_localizable_strings_from_markdown() function. Maybe we should combine them into one?
     """
 
-    # Declare return type
-    @dataclass
-    class LocalizedStringData:
-        key: str                    # a.key.that identifies the string across different languages
-        key_with_index_prefix: str  # Key that looks like 001:some.key or 002:some.other.key, etc. Where we call '002:' the 'index_prefix'. The index tells us the order that the keys appear in the source code (usually .vue files).
-        value: str                  # English UI String
-        comment: str | None         # A comment providing context for translators.
-        full_match: str             # The entire substring of the source file that we extracted the key, and comment from. Replace all full_matches with translated strings to localize the .md file.
-
     # Extract translatable strings
     #    using regex that matches ```MFLocalizedString('<key>', '<english ui string>, '<localizerHint>')```` calls.
     #    Notes:
@@ -794,7 +964,7 @@ def get_localizable_strings_from_website_source_code(source_code: str):
     matches = list(re.finditer(regex, source_code, re.DOTALL))
 
     # Assemble result
-    result: list[LocalizedStringData] = []
+    result: list[SourceCodeLocalizedStringData] = []
 
     for i, match in enumerate(matches):
 
@@ -844,7 +1014,7 @@ def get_localizable_strings_from_website_source_code(source_code: str):
         key_with_index_prefix = add_index_prefix_to_key(key, i, len(matches) - 1)
         
         # Store
-        result.append(LocalizedStringData(key, key_with_index_prefix, value, comment, full_match))
+        result.append(SourceCodeLocalizedStringData(key, key_with_index_prefix, value, comment, full_match))
     
     # Return
     return result
\ No newline at end of file
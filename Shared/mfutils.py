@@ -10,17 +10,23 @@ utlis.py holds various utility functions
 #
 
 # pip imports
+try:
+    import orjson   # Parses json a lot faster than the stdlib json module. (We fall back to stdlib json if it's not installed.)
+except ImportError:
+    orjson = None
 
 # stdlib imports  
 import tempfile
 import subprocess
+import shutil
 import os
-import textwrap
 import json
-import random
 import shlex
 import platform
 import re
+import functools
+import sys
+import concurrent.futures
 
 from dataclasses import dataclass
 
@@ -28,6 +34,8 @@ from dataclasses import dataclass
 # Command line tools
 #
 
+is_arm64_native_python = platform.system() == 'Darwin' and platform.machine() == 'arm64' # If python runs under Rosetta, platform.machine() returns 'x86_64' and subprocesses would also prefer x86_64 (I think that's why the clts launched as x86_64 on my M1 mac). See runclt().
+
 def clt_result_description(returncode, stdout, stderr) -> str:
     
     result = f"""\
@@ -46,6 +54,10 @@ stderr:
     
     return result
     
+@functools.lru_cache(maxsize=256) # shlex.split() tokenizes the string in python, and we often run the same command strings over and over.
+def split_command(command: str) -> tuple[str]:
+    return tuple(shlex.split(command))
+
 def runclt(command_arg: str | list, cwd: str = None, print_live_output: bool = False, prefer_arm64: bool = True) -> str | None:
     
     """
@@ -70,9 +82,7 @@ def runclt(command_arg: str | list, cwd: str = None, print_live_output: bool = F
     if type(command_arg) is list:
         commands = command_arg
     elif type(command_arg) is str:
-        commands = shlex.split(command_arg)
-    
-    command_name = commands[0]
+        commands = list(split_command(command_arg)) # Copy into a list, so we don't mutate the cached tuple
     
     # Handle non-standard return codes
     success_codes=[0]
@@ -82,94 +92,65 @@ def runclt(command_arg: str | list, cwd: str = None, print_live_output: bool = F
     # Launch the arm64 version of the clt
     #   Background: On my M1 mac all the clts are normally launched as x86_64 for some reason. This causes xcodebuild to fail with weird errors about provisioning profiles. 
     #   Explanation: `arch -arm64 -x86_64 <clt> <args>` will launch the -arm64 version of clt, if available, otherwise it should fall back to available archs.
-    if prefer_arm64:
+    #   Note: We skip this if python itself is running as arm64, since the clts then launch as arm64 anyways. That saves us from spawning the extra `arch` process for every command. (See is_arm64_native_python)
+    if prefer_arm64 and not is_arm64_native_python:
         commands = ['arch', '-arm64', '-x86_64'] + commands
     
-    # Run process and collect output
+    # Run process without live output
+    #   Note: subprocess.run() drains stdout and stderr concurrently (via proc.communicate()), so the process can't get stuck writing to a full stderr pipe while we're waiting for stdout. It also collects the output in one go instead of line-by-line.
     
-    stdout = ""
-    stderr = ""
-    returncode = None
-    with subprocess.Popen(commands, cwd=cwd, shell=False, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
-        
-        while True:
-            
-            # Print
-            if print_live_output:
-                print(f"{command_name}: stdout {{", end='\n')
-            
-            # Read stdout
-            while True:
-                
-                stdout_line = proc.stdout.readline()
-                if stdout_line == None or len(stdout_line) == 0:
-                    break                
-                else:
-                    stdout += f"\n{stdout_line}"
-                    if print_live_output:
-                        print(f"  > {stdout_line}", end='')
-            
-            # Print
-            if print_live_output:
-                print(f"}} endstdout: {command_name}", end='\n')
-                print(f"{command_name}: stderr {{", end='\n')
-
-            # Read stderr
-            while True:
-                
-                stderr_line = proc.stderr.readline()
-                if stderr_line == None or len(stderr_line) == 0:
-                    break                
-                else:
-                    stderr += f"\n{stderr_line}"
-                    if print_live_output:
-                        print(f"  > {stderr_line}", end='')
-                
-            # Print    
-            if print_live_output:
-                print(f"}} endstderr: {command_name}", end='\n')
-            
-            # Check if subproc has finished
-            returncode = proc.poll()
-            if returncode != None:
-                break
-
     if not print_live_output:
-        assert stderr == '' and returncode in success_codes, f"Command \n\"{shlex.join(commands)}\"\n was run in cwd \"{cwd}\" and failed with result:\n{ clt_result_description(returncode, stdout, stderr) }"
-        stdout = stdout.strip() # The stdout sometimes has trailing newline character which we remove here.
+        result = subprocess.run(commands, cwd=cwd, shell=False, text=True, capture_output=True)
+        assert result.stderr == '' and result.returncode in success_codes, f"Command \n\"{shlex.join(commands)}\"\n was run in cwd \"{cwd}\" and failed with result:\n{ clt_result_description(result.returncode, result.stdout, result.stderr) }"
+        stdout = result.stdout.strip() # The stdout sometimes has trailing newline character which we remove here.
         return stdout
-    else:
-        print('')
-        assert returncode in success_codes, f"Command \n\"{shlex.join(commands)}\"\n was run in cwd \"{cwd}\" and failed with result: { returncode }"  # Note that we allow stderr to be non-empty with print_live_output. It's ok since it's printed to the console, so we consider it 'handled' I guess.
-        return None
+    
+    # Run process and print output live
+    #   Notes:
+    #   - We let the process write straight to our stdout and stderr, instead of piping its output through python and printing it line-by-line. That way python doesn't have to touch the output at all, and the process can't get stuck on a full pipe.
+    #   - We flush our stdout first, so that our earlier prints appear before the process's output.
+    
+    sys.stdout.flush()
+    with subprocess.Popen(commands, cwd=cwd, shell=False) as proc:
+        returncode = proc.wait()
+    
+    print('')
+    assert returncode in success_codes, f"Command \n\"{shlex.join(commands)}\"\n was run in cwd \"{cwd}\" and failed with result: { returncode }"  # Note that we allow stderr to be non-empty with print_live_output. It's ok since it's printed to the console, so we consider it 'handled' I guess.
+    return None
 
-def runclt_insecure(command, cwd=None, exec=None): 
+def runclt_bytes(commands: list, cwd: str = None) -> bytes:
     
     """
-    Notes:
+    Like runclt(), but returns the raw stdout bytes.
     
-    This is a SECURITY PROBLEM.
-    -> What makes this insecure is if we set shell=True on subprocess.run and then pass in user-generated strings. 
-        (If you don't pass in user generated strings, this is ok to use)
-    -> We replaced this with runclt(), renamed this func to runclt_insecure() and added these notes about security in the commit after b052473ad4a5efd9128f2934daf15bdbd0daf8a7
+    Use this for output that you pass straight to a parser which accepts bytes (such as parse_json()). That way we skip decoding the output into a python str and reading it line-by-line.
     
-
-        
+    Notes: 
+    - Doesn't support print_live_output or shlex-splitting the command. Pass in the command and args as a list.
+    - Doesn't launch the arm64 version of the clt like runclt() does. (That's only needed for xcodebuild afaik.)
     """
     
-    assert False
+    # Run process
+    result = subprocess.run(commands, cwd=cwd, shell=False, capture_output=True)
     
-    success_codes=[0]
-    if command.startswith('git diff'): 
-        success_codes.append(1) # Git diff returns 1 if there's a difference
+    # Validate
+    assert result.stderr == b'' and result.returncode == 0, f"Command \n\"{shlex.join(commands)}\"\n was run in cwd \"{cwd}\" and failed with result:\n{ clt_result_description(result.returncode, result.stdout.decode('utf-8', errors='replace'), result.stderr.decode('utf-8', errors='replace')) }"
     
-    clt_result = subprocess.run(command, cwd=cwd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, executable=exec)
+    # Return
+    return result.stdout
+
+def runclt_many(command_args: list[str | list], cwd: str = None, max_workers: int = 8, prefer_arm64: bool = True) -> list[str]:
     
-    assert clt_result.stderr == '' and clt_result.returncode in success_codes, f"Command \"{command}\", run in cwd \"{cwd}\"\nreturned: {clt_result_description(clt_result)}"
+    """
+    Runs several independent commands in parallel using runclt(). Returns their stdouts in the same order as the `command_args`.
     
-    clt_result.stdout = clt_result.stdout.strip() # The stdout sometimes has trailing newline character which we remove here.
+    Notes:
+    - We use threads instead of processes, since the threads spend their time waiting for the subprocesses, which doesn't hold the GIL.
+    - Only use this for commands that don't depend on each other's results or side effects.
+    """
     
-    return clt_result.stdout
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda command_arg: runclt(command_arg, cwd=cwd, prefer_arm64=prefer_arm64), command_args))
 
 def run_git_command(repo_path, command):
     
@@ -177,15 +158,15 @@ def run_git_command(repo_path, command):
     Helper function to run a git command using subprocess. 
     (Credits: ChatGPT)
     
-    Should probably unify this into runCLT, along with other uses of `subprocess`
+    Notes:
+    - This doesn't use runclt(), since git likes to print progress and hints to stderr. runclt() treats any stderr output as a failure, while we only fail on a non-zero return code here.
     """
-    proc = subprocess.Popen(['git', '-C', repo_path] + command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = proc.communicate()
+    result = subprocess.run(['git', '-C', repo_path] + command, capture_output=True, encoding='utf-8')
 
-    if proc.returncode != 0:
-        raise RuntimeError(f"Git command error: {stderr.decode('utf-8')}")
+    if result.returncode != 0:
+        raise RuntimeError(f"Git command error: {result.stderr}")
 
-    return stdout.decode('utf-8')
+    return result.stdout
 
 
 #
@@ -193,7 +174,12 @@ def run_git_command(repo_path, command):
 #
 
 def add_indent(s, indent_spaces=2):
-    return textwrap.indent(s, ' ' * indent_spaces)
+    
+    # Note: This is a single pass in C, unlike textwrap.indent(), which goes line-by-line in python. 
+    #   Unlike textwrap.indent(), this also indents empty lines and only treats '\n' as a linebreak. That's fine for what we use this for (formatting clt output in clt_result_description()).
+    
+    prefix = ' ' * indent_spaces
+    return prefix + s.replace('\n', '\n' + prefix)
 
 def get_indent(string: str) -> tuple[int, chr]:
     
@@ -204,44 +190,39 @@ def get_indent(string: str) -> tuple[int, chr]:
         return 0, ''
 
     # Split into lines
-    lines = string.split('\n')
-    
-    # Remove lines empty lines (ones that have no chars or only whitespace)
-    def is_empty(string: str):
-        return len(string) == 0 or all(character.isspace() for character in string)
-    lines = list(filter(lambda line: not is_empty(line), lines))
+    #   And remove empty lines (ones that have no chars or only whitespace)
+    lines = [line for line in string.split('\n') if len(line) > 0 and not line.isspace()]
     
     # Special case
     if len(lines) == 0:
         return 0, ''
-
-    # Loop
-
-    indent_level = 0
-    break_outer_loop = False
     
-    while True:
-        
-        # Idea: If all lines have a an identical whitespace at the current indent_level, then we can increase the indent_level by 1. 
-        #   Note: GitHub Flavoured Markdown apparently considers 1 tab equal to 4 spaces. Don't know how we could handle that here. We'll just crash on tab.
-        
-        last_line = None
-        for line in lines:
-            
-            assert line[indent_level] != '\t' # Tabs are weird, we're not sure how to handle them.
-            
-            is_space = line[indent_level].isspace()
-            is_differnt = line[indent_level] != last_line[indent_level] if last_line != None else False
-            if not is_space or is_differnt: 
-                break_outer_loop = True; break
-            last_line = line
-        
-        if break_outer_loop:
-            break    
-        
-        indent_level += 1
+    # Find the indent
+    #   Idea: The indent is the longest whitespace-prefix that all lines share. 
+    #   Notes: 
+    #   - We start with the leading whitespace of the first line and shorten it until every line starts with it. That way we only walk over each line once (instead of walking over all lines once per indent_level).
+    #   - GitHub Flavoured Markdown apparently considers 1 tab equal to 4 spaces. Don't know how we could handle that here. We'll just crash on tab.
+    
+    first_line = lines[0]
+    indent = first_line[:len(first_line) - len(first_line.lstrip())]
+    for line in lines:
+        while not line.startswith(indent):
+            indent = indent[:-1]
+    
+    indent_level = len(indent)
+    
+    # Validate
+    #   Tabs are weird, we're not sure how to handle them.
+    #   (We check the indent, plus the character after the indent, up to the first line where the indent ends - that's the same set of characters that our old char-by-char loop used to check.)
+    assert '\t' not in indent
+    last_line = None
+    for line in lines:
+        assert line[indent_level] != '\t'
+        if not line[indent_level].isspace() or (last_line != None and line[indent_level] != last_line[indent_level]):
+            break
+        last_line = line
     
-    indent_char = None if indent_level == 0 else lines[0][0]
+    indent_char = None if indent_level == 0 else indent[0]
 
     return indent_level, indent_char
 
@@ -250,19 +231,14 @@ def set_indent(string: str, indent_level: int, indent_character: chr) -> str:
     # Get existing indent
     old_level, old_characer = get_indent(string)
     
-    # Remove existing indent
-    if old_level > 0:
-        unindented_lines = []
-        for line in string.split('\n'):
-            unindented_lines.append(line[old_level:])
-        string = '\n'.join(unindented_lines)
+    # Special case
+    if old_level == 0 and indent_level == 0:
+        return string
     
-    # Add new indent
-    if indent_level > 0:
-        indented_lines = []
-        for line in string.split('\n'):
-            indented_lines.append(indent_character*indent_level + line)
-        string = '\n'.join(indented_lines)
+    # Replace existing indent with new indent
+    #   Note: We remove the old indent and add the new indent in a single pass over the lines.
+    new_indent = indent_character*indent_level if indent_level > 0 else ''
+    string = '\n'.join(new_indent + line[old_level:] for line in string.split('\n'))
     
     # Return
     return string
@@ -521,6 +497,26 @@ def read_file(file_path, encoding='utf-8'):
     
     return result
 
+def read_file_bytes(file_path):
+    
+    # Use this instead of read_file() for content that you pass straight to a parser which accepts bytes (such as json.loads()) 
+    #   That way we skip decoding the whole file into a python str first.
+    
+    result = b''
+    with open(file_path, 'rb') as file:
+        result = file.read()
+    
+    return result
+
+def read_files(file_paths: list[str], encoding='utf-8', max_workers=16) -> dict[str, str]:
+    
+    # Reads several files in parallel. Returns a dict with structure: { file_path: content }
+    #   Notes: 
+    #   - We use threads since the threads spend most of their time waiting for the file reads, which doesn't hold the GIL. 
+    #   - Use this instead of calling read_file() in a loop, if you need the content of many files.
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(file_paths, executor.map(lambda file_path: read_file(file_path, encoding), file_paths)))
 
 def read_tempfile(temp_file_path, remove=True):
     
@@ -535,8 +531,20 @@ def write_file(file_path, content, encoding='utf-8'):
     with open(file_path, 'w', encoding=encoding) as file:
         file.write(content)
 
+def parse_json(content: str | bytes):
+    
+    # Use this instead of json.loads() for big inputs, such as .xcstrings files or .pbxproj files converted to json.
+    #   Notes:
+    #   - Uses orjson if it's installed, since that's a lot faster than the stdlib json module.
+    #   - We only use orjson for parsing. For writing we keep using stdlib json, since orjson doesn't support the `' : '` separators and indents that Xcode uses. (See write_xcstrings_file())
+    
+    if orjson != None:
+        return orjson.loads(content)
+    else:
+        return json.loads(content)
+
 def read_xcstrings_file(xcstrings_path: str) -> dict:
-    return json.loads(read_file(xcstrings_path))
+    return parse_json(read_file_bytes(xcstrings_path))
 
 def write_xcstrings_file(xcstrings_path: str, xcstrings_obj: dict):
     
@@ -552,8 +560,17 @@ def write_xcstrings_file(xcstrings_path: str, xcstrings_obj: dict):
 
 def convert_utf16_file_to_utf8(file_path):
     
-    content = read_file(file_path, 'utf-16')
-    write_file(file_path, content, encoding='utf-8')
+    # Notes:
+    # - We stream the content into a temp file in 64 KB chunks, instead of decoding the whole file into a python str and then writing it back. 
+    # - Then we move the temp file over the original file. That way the original file is never left half-written if something goes wrong.
+    
+    temp_file_path = file_path + '.utf8-conversion-temp'
+    
+    with open(file_path, 'r', encoding='utf-16') as source_file, open(temp_file_path, 'w', encoding='utf-8') as temp_file:
+        shutil.copyfileobj(source_file, temp_file, 64 * 1024)
+    
+    shutil.copymode(file_path, temp_file_path)
+    os.replace(temp_file_path, file_path)
 
 def is_file_empty(file_path):
     """Check if file is empty by confirming if its size is 0 bytes.
@@ -570,17 +587,17 @@ def xcode_project_uuid():
     The project.pbxproj file from Xcode uses 12 digit hexadecimal numbers (which have 24 characters) as keys/identifiers for it's 'objects'. So here we generate such an identifier. (In a really naive way)
     """
     
-    result = ""
-    for _ in range(24):
-        num = random.randint(0, 15)
-        hexa = hex(num)[2:].capitalize()
-        result += hexa
+    # Note: 12 random bytes are 24 hex characters. We uppercase them, since that's how Xcode writes them.
+    
+    result = os.urandom(12).hex().upper()
     
     assert(len(result) == 24)
     
     return result
     
 
+xcodebuild_list_scheme_regex = re.compile(r'^\s+(\S+)\s*$', re.MULTILINE) # Matches the indented scheme names that `xcodebuild -list` prints under 'Schemes:'. See find_xcode_project_build_schemes()
+
 def find_xcode_project_build_schemes(repo_path, project_path):
 
     # Credit: ChatGPT
@@ -595,8 +612,9 @@ def find_xcode_project_build_schemes(repo_path, project_path):
     result = runclt(f'xcodebuild -list -project "{project_path}" {extra_options}', cwd=repo_path)
     
     # Extract schemes using regex
-    schemes_string = result.split('Schemes:')[1]
-    result = re.findall(r'^\s+(\S+)\s*$', schemes_string, flags=re.MULTILINE)
+    #   Note: maxsplit=1 so we don't split up the rest of the output.
+    schemes_string = result.split('Schemes:', 1)[1]
+    result = xcodebuild_list_scheme_regex.findall(schemes_string)
     
     # Return
     return result
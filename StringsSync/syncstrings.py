@@ -119,6 +119,10 @@ def main():
         print(f"syncstrings.py: Syncing .vue files: {vuefile_paths}")
         print("")
 
+        # Load source files
+        #   Note: We read all the files in parallel up front.
+        vue_contents = mfutils.read_files(vuefile_paths)
+        
         # Extract strings from .vue files
         for vue_path in vuefile_paths:
     
@@ -131,10 +135,8 @@ def main():
             print(f"syncstrings.py: Syncing {vue_path} ◢")
             print(f"                                               {xcstrings_path}")
 
-            # Load source file
-            vue_content = None
-            with open(vue_path, 'r') as file:
-                vue_content = file.read()
+            # Get source file content
+            vue_content = vue_contents[vue_path]
             
             # Declare loop result
             extracted_strings: list[StringsDataItem_NoValue] = []
@@ -167,6 +169,10 @@ def main():
         print("    (Most .xcstrings file are automatically synced by Xcode when building the project, but here we sync the ones not managed by Xcode)")
         print("")
 
+        # Load source files
+        #   Note: We read all the files in parallel up front.
+        source_file_contents = mfutils.read_files(main_repo['source_paths'])
+        
         # Extract strings from source_files        
         for source_file in main_repo['source_paths']:
 
@@ -177,10 +183,8 @@ def main():
             # Log
             print(f"syncstrings.py: Syncing {xcstrings_path}")
 
-            # Load content
-            content = None
-            with open(source_file, 'r') as file:
-                content = file.read()
+            # Get content
+            content = source_file_contents[source_file]
             
             # Declare result
             extracted_strings: list[StringsDataItem] = []
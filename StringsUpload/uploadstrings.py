@@ -106,9 +106,9 @@ def main():
     
     # Store more stuff
     #   (To get localization progress)
-    xcstring_objects_all_repos = []
+    state_counts_all_repos = None
+    missing_keys_all_repos = None
     localization_progess_all_repos = None
-    translation_locales_all_repos = None
     
     # Create temp_dir
     temp_dir = tempfile.gettempdir() + '/mmf-uploadstrings'
@@ -170,17 +170,16 @@ def main():
         # Log
         print(f"Loading all .xcstring files ...\n")
         
-        # Load all .xcstrings files
-        xcstring_objects = []
+        # Find all .xcstrings files
         glob_pattern = './' + os.path.normpath(f'{repo_path}/**/*.xcstrings') # Not sure normpath is necessary
         xcstring_filenames = glob.glob(glob_pattern, recursive=True)
-        for f in xcstring_filenames:
-            with open(f, 'r') as content:
-                xcstring_objects.append(json.load(content))
         
         # Store stuff for localization_progress
-        xcstring_objects_all_repos += xcstring_objects
-        translation_locales_all_repos = translation_locales # Since we assert that the translation_locales are the same for all repos, this works
+        #   Notes: 
+        #   - We count the translation states right away, instead of keeping the parsed .xcstrings files of all repos in memory until we compute the localization_progress after the loop. 
+        #       count_localization_states() loads the files one-by-one, so only one parsed file has to be in memory at a time.
+        #   - We need to count before we export the .xcloc files below, since xcodebuild might change the .xcstrings files during the export. (That's how it was when we kept the parsed files around.)
+        state_counts_all_repos, missing_keys_all_repos = mflocales.count_localization_states(xcstring_filenames, translation_locales, state_counts_all_repos, missing_keys_all_repos)
         
         # Log
         print(f".xcstring file paths: { json.dumps(xcstring_filenames, ensure_ascii=False, indent=2) }\n")
@@ -244,7 +243,7 @@ def main():
         repo_data[repo_name]['xcloc_dir'] = xcloc_dir
     
     # Get combined localization_progress
-    localization_progess_all_repos = mflocales.get_localization_progress(xcstring_objects_all_repos, translation_locales_all_repos)
+    localization_progess_all_repos = mflocales.get_localization_progress_from_state_counter(state_counts_all_repos, missing_keys_all_repos)
     
     # Log
     print(f"Taking localization screenshots and storing them into the .xcloc file for every locale...\n")
@@ -373,7 +372,8 @@ def main():
     
     zip_file_format = "MacMouseFixTranslations.{}.zip" # GitHub Releases assets seemingly can't have spaces, that's why we're using this separate format
     
-    zip_files = {}
+    zip_file_names = {}
+    zip_commands = []
     for l, l_dir in zip(translation_locales, locale_export_dirs):
         
         base_dir = temp_dir
@@ -385,11 +385,21 @@ def main():
         if os.path.exists(zip_file_path):
             rm_result = mfutils.runclt(['rm', '-R', zip_file_path]) # We first remove any existing zip_file, because otherwise the `zip` CLT will combine the existing archive with the new data we're archiving which is weird. (If I understand the `zip` man correctly`)
             print(f'Zip file of same name already existed. Calling rm on the zip_file returned: { mfutils.clt_result_description(rm_result) }')
-            
-        zip_result = mfutils.runclt(['zip', '-r', zip_file_name, zippable_dir_name], cwd=base_dir) # We need to set the cwd (current working directory) like this, if we use abslute path to the zip_file and xcloc file, then the `zip` clt will recreate the whole path from our system root inside the zip archive. Not sure why.
-        # print(f'zip clt returned: { zip_result }')
         
-        with open(zip_file_path, 'rb') as zip_file:
+        zip_file_names[l] = zip_file_name
+        zip_commands.append(['zip', '-r', zip_file_name, zippable_dir_name])
+    
+    # Run zip commands
+    #   Notes: 
+    #   - We need to set the cwd (current working directory) like this, if we use abslute path to the zip_file and xcloc file, then the `zip` clt will recreate the whole path from our system root inside the zip archive. Not sure why.
+    #   - The zip commands for the different locales are independent of each other, so we run them in parallel.
+    zip_results = mfutils.runclt_many(zip_commands, cwd=temp_dir)
+    # print(f'zip clt returned: { zip_results }')
+    
+    zip_files = {}
+    for l, zip_file_name in zip_file_names.items():
+        
+        with open(os.path.join(temp_dir, zip_file_name), 'rb') as zip_file:
             # Load the zip data
             zip_file_content = zip_file.read()
             # Store the data in the GitHub API format